@@ -1,16 +1,43 @@
 from __future__ import annotations
 
+import re
 import sys
-from typing import List
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, NamedTuple, Optional
 
-from langchain_ollama import OllamaLLM
 import json
-from langchain_core.prompts import PromptTemplate
+
+try:
+	import orjson
+
+	def _json_loads(text: str):
+		return orjson.loads(text)
+
+	def _json_dumps(obj) -> str:
+		# orjson emits UTF-8 without escaping, like ensure_ascii=False
+		return orjson.dumps(obj).decode()
+except ImportError:  # pragma: no cover - orjson is optional
+	def _json_loads(text: str):
+		return json.loads(text)
+
+	def _json_dumps(obj) -> str:
+		return json.dumps(obj, ensure_ascii=False)
+
+if TYPE_CHECKING:
+	# LangChain is heavy to import; it is loaded on the first build_llm() call
+	from langchain_ollama import OllamaLLM
 
 from app.config import get_config
 from app.db.neo4j_client import run_query
+from app.agent.cache import SemanticCache
 from app.agent.tools import (
 	ensure_vector_indexes,
+	embed_queries,
+	embed_query,
+	get_all_topics,
 	vector_search_documents,
 	grade_answer,
 	get_student_knowledge,
@@ -19,171 +46,522 @@ from app.agent.tools import (
 	summarize_with_validation,
 )
 
+# Debug output is only printed in CLI mode (not in the web server); stdout does not change mid-process
+_IS_CLI = sys.stdout.isatty()
+# Per-turn traces (routing, memory, context) also need AGENT_DEBUG; errors are printed in any CLI run
+_DEBUG = _IS_CLI and get_config().agent_debug
+
+_VALID_TOOLS = frozenset({
+	"knowledge_report",
+	"topic_summary",
+	"retrieve_docs",
+	"grade_exercise",
+	"recommend_exercises",
+	"ask_exercise",
+	"grade_pending",
+	"summarize_topic",
+})
+
+# Matches the common router output {"tool": "...", "input": "..."} with no escapes or nested objects
+_ROUTER_SIMPLE_RE = re.compile(r'^\{\s*"tool"\s*:\s*"([^"\\]*)"\s*,\s*"input"\s*:\s*"([^"\\]*)"\s*\}$')
+
+# Unambiguous phrasings routed without calling the LLM: (pattern, tool). The "arg" group is the tool input.
+_FAST_ROUTES = [
+	(re.compile(r"^(?:dame|quiero|proponme|ponme)\s+(?:un|otro)\s+ejercicio\s+(?:de|sobre)\s+(?P<arg>.+?)(?:\s+para\s+practicar)?[.!?]*$", re.I), "ask_exercise"),
+	(re.compile(r"^(?:dame|mu[eé]strame|quiero)\s+(?:los\s+)?ejercicios\s+(?:de|sobre)\s+(?P<arg>.+?)[.!?]*$", re.I), "recommend_exercises"),
+	(re.compile(r"^mi\s+respuesta\s+es\s*:?\s*(?P<arg>.+)$", re.I | re.S), "grade_pending"),
+	(re.compile(r"^¿?\s*cu[aá]l\s+es\s+mi\s+nivel\s+(?:en|de|sobre)\s+(?P<arg>.+?)\s*\??$", re.I), "knowledge_report"),
+	(re.compile(r"^mu[eé]strame\s+mis\s+niveles(?:\s+en\s+todos\s+los\s+temas)?[.!?]*(?P<arg>)$", re.I), "knowledge_report"),
+	(re.compile(r"^res[uú]meme\s+mi\s+actividad\s+(?:en|de|sobre)\s+(?P<arg>.+?)[.!?]*$", re.I), "topic_summary"),
+	(re.compile(r"^(?:hazme|haz|dame)\s+un\s+resumen\s+(?:sobre|de)\s+(?!mis?\b)(?P<arg>.+?)[.!?]*$", re.I), "summarize_topic"),
+]
+
+
+def _any_phrase_re(phrases: Iterable[str], prefixes: Iterable[str] = ()) -> "re.Pattern[str]":
+	"""
+	Single alternation that finds any of phrases anywhere, or any of prefixes at the start.
+	"""
+	alternatives = [re.escape(p) for p in phrases]
+	if prefixes:
+		alternatives.insert(0, "^(?:" + "|".join(re.escape(p) for p in prefixes) + ")")
+	return re.compile("|".join(alternatives))
+
+
+# Keyword checks used while an exercise is pending (substring matches on the lowercased input)
+_NEW_EXERCISE_RE = _any_phrase_re((
+	"dame otro", "dame otro ejercicio", "otro ejercicio", "cambiar", "nuevo ejercicio",
+	"ejercicio de", "dame un ejercicio", "quiero practicar", "ejercicios sobre", "ejercicios de",
+	"dame ejercicios", "lista de ejercicios", "muestrame ejercicios",
+))
+# Questions: starts with a question word or contains a question phrase
+_QUESTION_RE = _any_phrase_re(
+	(
+		"que es", "que son", "como funciona", "como se", "cual es", "cuales son",
+		"donde", "por que", "porque", "explica", "explicame", "dime sobre",
+		"cuenta sobre", "habla de", "resume", "muestra", "consulta",
+	),
+	prefixes=("que", "como", "cual", "donde", "por que", "porque", "expl", "dime", "cuenta", "habla", "resume", "muestra", "consult"),
+)
+_VERY_EXPLICIT_NEW_EXERCISE_RE = _any_phrase_re((
+	"dame otro ejercicio", "otro ejercicio", "nuevo ejercicio",
+	"quiero practicar", "ejercicio de",
+))
+
+
+def _fast_route(user_text: str) -> Optional[tuple[str, str]]:
+	"""
+	Routes clearly-phrased requests with regexes. Returns None when the LLM router is needed.
+	"""
+	text = user_text.strip()
+	for pattern, tool_name in _FAST_ROUTES:
+		m = pattern.match(text)
+		if m:
+			return tool_name, m.group("arg").strip()
+	return None
+
+
+# Plain-text grade_exercise input: "exercise_id: ..." and "answer: ..." / "respuesta: ..." lines
+_GRADE_FALLBACK_RE = re.compile(
+	r"^[^\n]*?exercise_id[^:\n]*:(?P<ex>[^\n]*)$|^(?:answer|respuesta)[^:\n]*:(?P<ans>[^\n]*)$",
+	re.I | re.M,
+)
+
+_answer_cache: Optional[SemanticCache] = None
+
+
+def build_semantic_cache() -> Optional[SemanticCache]:
+	cfg = get_config()
+	if not cfg.semantic_cache_enabled:
+		return None
+	return SemanticCache(
+		threshold=cfg.semantic_cache_threshold,
+		max_size=cfg.semantic_cache_size,
+		ttl_seconds=cfg.semantic_cache_ttl,
+	)
+
+
+def get_answer_cache() -> Optional[SemanticCache]:
+	"""
+	Process-wide semantic cache for RAG answers (answers do not depend on the student).
+	"""
+	global _answer_cache
+	if _answer_cache is None:
+		_answer_cache = build_semantic_cache()
+	return _answer_cache
+
+
+_summary_cache: Optional[SemanticCache] = None
+
+
+def get_summary_cache() -> Optional[SemanticCache]:
+	"""
+	Process-wide semantic cache for summarize_topic results, kept apart from RAG answers to the same text.
+	"""
+	global _summary_cache
+	if _summary_cache is None:
+		_summary_cache = build_semantic_cache()
+	return _summary_cache
+
+
+def summarize_topic(llm: OllamaLLM, topic: str) -> str:
+	"""
+	summarize_with_validation behind the summary cache: a repeated topic skips the draft/validate/regenerate calls.
+	"""
+	cache = get_summary_cache()
+	if cache is None:
+		return summarize_with_validation(llm, topic, max_sources=5)
+	t_vec = embed_query(topic)
+	cached, _ = cache.search(t_vec)
+	if cached is not None:
+		return cached
+	summary = summarize_with_validation(llm, topic, max_sources=5)
+	cache.put(t_vec, summary)
+	return summary
+
+
+# Row formatters for tool output, bound once. `:.2f` accepts the ints/floats returned by Neo4j as-is.
+_format_knowledge_row = "{nombre} ({topic_id}): nivel {level:.2f}".format
+_format_summary_row = (
+	"{nombre} ({topic_id}): sesiones {sessions}, respuestas {answers}, conf. prom {avg_conf:.2f}, "
+	"correctitud {correctness_rate:.2f}, última {last_activity}"
+).format
+_format_exercise_item = "{i}. {task}\n   Dificultad: {difficulty:.2f} | ID: {id}\n\n".format
+
+# Legajos already merged by this process; the server calls upsert_student on every message
+_known_legajos: set[str] = set()
+
 
 def upsert_student(legajo: str) -> None:
+	if legajo in _known_legajos:
+		return
 	cypher = """
 	MERGE (s:Student {legajo: $legajo})
 	RETURN s.legajo AS legajo
 	"""
 	run_query(cypher, {"legajo": legajo})
+	_known_legajos.add(legajo)
 
 
 def build_llm() -> OllamaLLM:
+	from langchain_ollama import OllamaLLM
+
 	cfg = get_config()
 	print(f"Building LLM with model {cfg.ollama_model} and base URL {cfg.ollama_base_url}")
 	return OllamaLLM(base_url=cfg.ollama_base_url, model=cfg.ollama_model, temperature=0.7)
 
 
-def answer_with_rag(llm: OllamaLLM, question: str) -> str:
-	docs = vector_search_documents(question, top_k=5)
+def build_router_llm() -> OllamaLLM:
+	"""
+	LLM used only to pick the tool. Ollama constrains its output to JSON and it samples greedily.
+	ROUTER_MODEL selects a smaller model for routing; it defaults to OLLAMA_MODEL.
+	"""
+	from langchain_ollama import OllamaLLM
+
+	cfg = get_config()
+	return OllamaLLM(base_url=cfg.ollama_base_url, model=cfg.router_model or cfg.ollama_model, temperature=0, format="json")
+
+
+def ensure_ollama_model(model: str) -> None:
+	"""
+	Pulls model into the local Ollama if it is not there yet. Errors are reported, not raised.
+	"""
+	import requests
+
+	base_url = get_config().ollama_base_url.rstrip("/")
+	try:
+		resp = requests.post(f"{base_url}/api/show", json={"model": model}, timeout=10)
+		if resp.status_code == 404:
+			print(f"Descargando el modelo {model} en Ollama...", file=sys.stderr)
+			resp = requests.post(f"{base_url}/api/pull", json={"model": model, "stream": False}, timeout=None)
+		resp.raise_for_status()
+	except Exception as e:
+		print(f"Warning: could not ensure Ollama model {model}: {e}", file=sys.stderr)
+
+
+# RAG answer prompt; a plain str.format template (same syntax PromptTemplate used), bound once
+_format_rag_prompt = (
+	"You are a helpful teaching assistant. Answer concisely using the context.\n"
+	"Context:\n{context}\n\n"
+	"Question: {question}\n\n"
+	"Answer in Spanish. If unsure, say you don't know."
+).format
+
+RAG_TOP_K = 5
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-prefetch")
+
+
+def prefetch_documents(question: str) -> Future:
+	"""
+	Starts the RAG retrieval for question in the background and returns its future.
+	"""
+	return _prefetch_pool.submit(vector_search_documents, question, RAG_TOP_K)
+
+
+# Roughly 1500 tokens of retrieved context; anything beyond is dropped before prompting
+MAX_CONTEXT_CHARS = 6000
+
+
+def build_rag_context(docs: List[dict], max_chars: int = MAX_CONTEXT_CHARS) -> tuple[str, List[str]]:
+	"""
+	Builds the RAG context from ranked documents (each doc, then its sections) until max_chars is reached.
+	Returns (context, sources) where sources are the unique names of the documents that were used.
+	"""
 	context_parts: List[str] = []
-	sources: List[str] = []
+	sources: dict[str, None] = {}
+	used = 0
+	full = False
 	for d in docs:
-		if d.get("nombre"):
-			sources.append(d["nombre"])
+		blocks: List[str] = []
 		if d.get("content"):
-			context_parts.append(f"Doc: {d.get('nombre','')}\n{d['content']}")
+			blocks.append(f"Doc: {d.get('nombre','')}\n{d['content']}")
 		for s in (d.get("sections") or []):
 			if s.get("content"):
-				context_parts.append(f"Section: {s.get('id','')}\n{s['content']}")
+				blocks.append(f"Section: {s.get('id','')}\n{s['content']}")
+		for block in blocks:
+			# +2 for the blank line separating blocks
+			if used + len(block) + 2 > max_chars:
+				full = True
+				break
+			context_parts.append(block)
+			used += len(block) + 2
+			if d.get("nombre"):
+				sources[d["nombre"]] = None
+		if full:
+			break
 	context = "\n\n".join(context_parts) if context_parts else "No context found."
+	return context, list(sources)
 
-	template = PromptTemplate(
-		input_variables=["question", "context"],
-		template=(
-			"You are a helpful teaching assistant. Answer concisely using the context.\n"
-			"Context:\n{context}\n\n"
-			"Question: {question}\n\n"
-			"Answer in Spanish. If unsure, say you don't know."
-		),
-	)
-	prompt = template.format(question=question, context=context)
-	response = llm.invoke(prompt)
+
+def answer_with_rag(llm: OllamaLLM, question: str, docs_future: Optional[Future] = None) -> str:
+	return "".join(stream_answer_with_rag(llm, question, docs_future))
+
+
+def stream_answer_with_rag(llm: OllamaLLM, question: str, docs_future: Optional[Future] = None) -> Iterator[str]:
+	"""
+	Same as answer_with_rag, but yields the answer as the LLM produces it.
+	Cached answers are yielded in a single chunk; the sources line is the last chunk.
+	docs_future may hold a retrieval for the question started earlier (see prefetch_documents).
+	"""
+	cache = get_answer_cache()
+	q_vec = embed_query(question)
+	if cache is not None:
+		cached, _ = cache.search(q_vec)
+		if cached is not None:
+			yield cached
+			return
+	if docs_future is not None:
+		docs = docs_future.result()
+	else:
+		docs = vector_search_documents(question, top_k=RAG_TOP_K, q_vec=q_vec)
+	context, sources = build_rag_context(docs)
+
+	prompt = _format_rag_prompt(question=question, context=context)
+	chunks: List[str] = []
+	for chunk in llm.stream(prompt):
+		chunks.append(chunk)
+		yield chunk
 	ref = f"\n\nFuente(s): {', '.join(sources)}" if sources else ""
-	return f"{response}{ref}"
+	if ref:
+		yield ref
+	if cache is not None:
+		cache.put(q_vec, "".join(chunks) + ref)
+
+
+_format_batch_rag_prompt = (
+	"You are a helpful teaching assistant. Answer each question concisely using its own context.\n\n"
+	"{blocks}\n\n"
+	"Answer in Spanish. If unsure about a question, say you don't know.\n"
+	"Return ONLY a JSON array of {n} strings, one answer per question, in the same order."
+).format
 
 
-def build_router_prompt(legajo: str, user_text: str, history: list[dict] | None = None, has_pending_exercise: bool = False) -> str:
+def answer_many_with_rag(llm: OllamaLLM, questions: List[str]) -> List[str]:
 	"""
-	Builds the routing prompt for the LLM to select the appropriate tool.
-	Returns a single string prompt expecting a strict JSON output: { "tool": "...", "input": "..." }
+	Answers several conceptual questions with a single LLM call.
+	Questions are embedded in one batch and each gets its own retrieved context, fetched concurrently.
+	Falls back to one answer_with_rag call per question if the model output cannot be parsed.
+	"""
+	if len(questions) <= 1:
+		return [answer_with_rag(llm, q) for q in questions]
+	q_vecs = embed_queries(questions)
+	blocks: List[str] = []
+	refs: List[str] = []
+	# Share the context budget between the questions
+	budget = max(MAX_CONTEXT_CHARS // len(questions), 1000)
+	# The retrievals are independent: run them concurrently and join in question order
+	futures = [
+		_prefetch_pool.submit(vector_search_documents, question, RAG_TOP_K, q_vec)
+		for question, q_vec in zip(questions, q_vecs)
+	]
+	for i, (question, future) in enumerate(zip(questions, futures), start=1):
+		context, sources = build_rag_context(future.result(), max_chars=budget)
+		blocks.append(f"Q{i}: {question}\nContext for Q{i}:\n{context}")
+		refs.append(f"\n\nFuente(s): {', '.join(sources)}" if sources else "")
+	raw = llm.invoke(_format_batch_rag_prompt(blocks="\n\n".join(blocks), n=len(questions)))
+	try:
+		start = raw.find("[")
+		end = raw.rfind("]")
+		answers = _json_loads(raw[start : end + 1]) if start != -1 and end > start else None
+	except ValueError:
+		answers = None
+	if not isinstance(answers, list) or len(answers) != len(questions):
+		return [answer_with_rag(llm, q) for q in questions]
+	return [f"{a}{ref}" for a, ref in zip(answers, refs)]
+
+
+# Number of recent turns kept as conversational context
+HISTORY_SIZE = 6
+
+# Static parts of the router prompt, rendered once at import time
+# Kept short: router latency grows with the prompt length (prefill)
+_ROUTER_TOOLSPEC = (
+	"Herramientas (elige UNA), tool(input):\n"
+	"- knowledge_report(tema; vacío = todos): nivel de conocimiento\n"
+	"- topic_summary(tema; vacío = todos): resumen de actividad\n"
+	"- retrieve_docs(pregunta): preguntas conceptuales\n"
+	"- recommend_exercises(tema disponible): listar ejercicios para practicar\n"
+	"- ask_exercise(tema disponible): proponer UN ejercicio y dejarlo pendiente\n"
+	"- grade_pending(respuesta): corregir el ejercicio pendiente\n"
+	"- summarize_topic(tema): resumen del tema con fuentes\n"
+	"- grade_exercise({'exercise_id','answer_text'}): corregir un ejercicio específico\n"
+)
+
+_ROUTER_PENDING_WARNING = (
+	"\nHAY EJERCICIO PENDIENTE: si el usuario responde, usa grade_pending; "
+	"ask_exercise solo si pide explícitamente otro ejercicio.\n"
+)
+
+# One example per tool
+_ROUTER_EXAMPLES = (
+	("¿Cuál es mi nivel en CPU?", {"tool": "knowledge_report", "input": "CPU"}),
+	("Resúmeme mi actividad en Algoritmos", {"tool": "topic_summary", "input": "Algoritmos"}),
+	("¿Qué es una CPU?", {"tool": "retrieve_docs", "input": "¿Qué es una CPU?"}),
+	("Dame ejercicios sobre CPU", {"tool": "recommend_exercises", "input": "CPU"}),
+	("Dame un ejercicio de SQL para practicar", {"tool": "ask_exercise", "input": "SQL"}),
+	("Mi respuesta es: Es un lenguaje declarativo para manejar datos", {"tool": "grade_pending", "input": "Es un lenguaje declarativo para manejar datos"}),
+	("Hazme un resumen sobre arquitectura de procesadores 8086", {"tool": "summarize_topic", "input": "arquitectura de procesadores 8086"}),
+	("Evalúa mi respuesta al ejercicio ex_cpu_1: Es la unidad que ejecuta instrucciones", {"tool": "grade_exercise", "input": {"exercise_id": "ex_cpu_1", "answer_text": "Es la unidad que ejecuta instrucciones"}}),
+)
+
+_ROUTER_EXAMPLES_STR = "\n".join(
+	f"Usuario: {u}\nSalida JSON: {json.dumps(j, ensure_ascii=False)}" for u, j in _ROUTER_EXAMPLES
+)
+
+
+TOPICS_TTL_SECONDS = 60
+
+
+@lru_cache(maxsize=1)
+def _topics_info_cached(bucket: int) -> str:
+	"""
+	Returns the router's block listing the available topics.
+	bucket only keys the cache; a new bucket value refetches the topics from Neo4j.
 	"""
-	# Get available topics to include in the prompt
-	from app.agent.tools import get_all_topics
 	available_topics = get_all_topics()
 	topic_names = [t["nombre"] for t in available_topics] if available_topics else []
 	topics_info = ""
 	if topic_names:
-		topics_info = f"\n⚠️ TEMAS DISPONIBLES: {', '.join(topic_names)}\n" + \
-			"IMPORTANTE: Solo puedes usar estos temas. Si el usuario pide un tema que no está en esta lista, " + \
-			"debes usar el tema más cercano de la lista, o informar que el tema no está disponible.\n"
-	
-	toolspec = (
-		"Herramientas disponibles (elige UNA):\n"
-		"- knowledge_report: informar nivel(es) de conocimiento. input: nombre o id del tema (vacío para todos). "
-		"Si el usuario pide TODOS los temas, usa input vacío.\n"
-		"- topic_summary: resumir actividad por tema. input: nombre o id del tema (vacío para todos)\n"
-		"- retrieve_docs: recuperar contexto para responder preguntas conceptuales. input: la pregunta\n"
-		"- recommend_exercises: recomendar ejercicios para practicar un tema según tu nivel actual. input: texto con el nombre del tema (DEBE ser uno de los temas disponibles)\n"
-		"- ask_exercise: proponer un ejercicio concreto para un tema y dejarlo pendiente para corregir. input: texto con el nombre del tema (DEBE ser uno de los temas disponibles)\n"
-		"- grade_pending: corregir la respuesta del ejercicio pendiente. input: el texto de la respuesta del usuario\n"
-		"- summarize_topic: generar un resumen del tema solicitado usando fuentes recuperadas y validación/regeneración si hiciera falta. input: texto del tema\n"
-		"- grade_exercise: (alternativa avanzada) evaluar respuesta de un ejercicio específico. input JSON: {'exercise_id':'...','answer_text':'...'}\n"
-	)
-	
-	pending_warning = ""
-	if has_pending_exercise:
-		pending_warning = (
-			"\n⚠️ IMPORTANTE: Hay un ejercicio pendiente de corrección. "
-			"Si el usuario está respondiendo al ejercicio (no está pidiendo explícitamente otro ejercicio), "
-			"DEBES usar 'grade_pending'. Solo usa 'ask_exercise' si el usuario EXPLÍCITAMENTE pide un nuevo ejercicio "
-			"(por ejemplo: 'dame otro ejercicio', 'quiero practicar SQL', etc.). "
-			"Si el usuario simplemente escribe una respuesta o frase relacionada, usa 'grade_pending'.\n"
-		)
-	
+		topics_info = f"\nTEMAS: {'|'.join(topic_names)} (usa el más cercano)\n"
+	return topics_info
+
+
+def topics_info_cached() -> str:
+	"""
+	Topics block of the router prompt, refreshed at most once per TOPICS_TTL_SECONDS.
+	"""
+	return _topics_info_cached(int(time.monotonic() // TOPICS_TTL_SECONDS))
+
+
+@lru_cache(maxsize=256)
+def _router_prompt_head(legajo: str, topics_info: str, has_pending_exercise: bool) -> str:
+	"""
+	System text and tool spec of the router prompt. Constant for a session until the topics change.
+	"""
 	router_system = (
-		f"Eres un asistente que decide qué herramienta usar según la consulta del usuario con legajo {legajo}. "
-		"Devuelve EXCLUSIVAMENTE un JSON con dos claves: tool e input. Nada más. "
-		"Usa el contexto reciente para resolver referencias (p.ej., 'ahora sobre SQL')."
+		f"Elige la herramienta para la consulta del usuario con legajo {legajo}. "
+		"Devuelve SOLO un JSON {\"tool\": ..., \"input\": ...}. "
+		"Usa el contexto reciente para resolver referencias."
 		+ topics_info
-		+ pending_warning
+		+ (_ROUTER_PENDING_WARNING if has_pending_exercise else "")
 	)
+	return f"{router_system}\n\n{_ROUTER_TOOLSPEC}\n\n"
+
+
+def build_router_prompt(legajo: str, user_text: str, history: Iterable[HistoryItem] | None = None, has_pending_exercise: bool = False) -> str:
+	"""
+	Builds the routing prompt for the LLM to select the appropriate tool.
+	Returns a single string prompt expecting a strict JSON output: { "tool": "...", "input": "..." }
+	Only the history and user text are rendered per call; the head is cached per legajo/topics/pending flag.
+	history is expected to be already bounded (the agent keeps a deque of the last HISTORY_SIZE turns).
+	"""
+	topics_info = topics_info_cached()
+	head = _router_prompt_head(legajo, topics_info, has_pending_exercise)
 	# Contexto reciente
-	ctx_lines: list[str] = []
+	ctx_block = ""
 	if history:
-		ctx_lines.append("Contexto reciente (máx 6):")
-		for item in history[-6:]:
-			u = (item.get("user_prompt") or "").strip()
-			t = (item.get("tool_used") or "").strip()
-			a = (item.get("agent_response") or "").strip()
-			if len(a) > 300:
-				a = a[:297] + "..."
-			ctx_lines.append(f"- U: {u} | Tool: {t or 'desconocido'} | A: {a}")
-		ctx_lines.append("")
-	examples = [
-		("¿Cuál es mi nivel en CPU?", {"tool": "knowledge_report", "input": "CPU"}),
-		("Muéstrame mis niveles en todos los temas", {"tool": "knowledge_report", "input": ""}),
-		("Resúmeme mi actividad en Algoritmos", {"tool": "topic_summary", "input": "Algoritmos"}),
-		("¿Qué es una CPU?", {"tool": "retrieve_docs", "input": "¿Qué es una CPU?"}),
-		("Dame ejercicios sobre CPU", {"tool": "recommend_exercises", "input": "CPU"}),
-		("Preguntas para practicar Unidad de procesamiento", {"tool": "recommend_exercises", "input": "Unidad de procesamiento"}),
-		("Dame un ejercicio de SQL para practicar", {"tool": "ask_exercise", "input": "SQL"}),
-		("Mi respuesta es: Es un lenguaje declarativo para manejar datos", {"tool": "grade_pending", "input": "Es un lenguaje declarativo para manejar datos"}),
-		("Hazme un resumen sobre arquitectura de procesadores 8086", {"tool": "summarize_topic", "input": "arquitectura de procesadores 8086"}),
-		("Evalúa mi respuesta al ejercicio ex_cpu_1: Es la unidad que ejecuta instrucciones", {"tool": "grade_exercise", "input": {"exercise_id": "ex_cpu_1", "answer_text": "Es la unidad que ejecuta instrucciones"}}),
-	]
-	ex_str = "\n".join([f"Usuario: {u}\nSalida JSON: {json.dumps(j, ensure_ascii=False)}" for u, j in examples])
-	prompt = (
-		f"{router_system}\n\n{toolspec}\n\n"
-		+ ("\n".join(ctx_lines) if ctx_lines else "")
-		+ f"{ex_str}\n\n"
-		f"Usuario: {user_text}\nSalida JSON:"
+		ctx_block = f"Contexto reciente (máx {HISTORY_SIZE}):\n" + "".join(
+			item.router_line for item in history
+		)
+	return f"{head}{ctx_block}{_ROUTER_EXAMPLES_STR}\n\nUsuario: {user_text}\nSalida JSON:"
+
+
+def _parse_router_output(raw: str) -> Optional[tuple[str, str]]:
+	"""
+	Extracts (tool, input) from the router's raw output. Object inputs are returned JSON-encoded.
+	Returns None if there is no JSON object; raises ValueError on malformed JSON.
+	"""
+	start = raw.find("{")
+	end = raw.rfind("}")
+	if start == -1 or end == -1 or start >= end:
+		return None
+	body = raw[start : end + 1]
+	m = _ROUTER_SIMPLE_RE.match(body)
+	if m:
+		return m.group(1).strip(), m.group(2).strip()
+	obj = _json_loads(body)
+	if not isinstance(obj, dict):
+		raise ValueError("Router output is not a JSON object")
+	tool_name = str(obj.get("tool") or "").strip()
+	tool_input = obj.get("input")
+	if isinstance(tool_input, (dict, list)):
+		return tool_name, _json_dumps(tool_input)
+	return tool_name, str(tool_input or "").strip()
+
+
+def format_history_line(user_prompt: str, agent_response: str, tool_used: str) -> str:
+	"""
+	Renders one conversation turn as a router-prompt context line.
+	agent_response is used as given (HistoryItem.create already trimmed it).
+	"""
+	return (
+		f"- U: {user_prompt.strip()} | Tool: {tool_used.strip() or 'desconocido'} | "
+		f"A: {agent_response}\n"
 	)
-	return prompt
 
 
-def initialize_agent(legajo: str, llm: OllamaLLM):
+class HistoryItem(NamedTuple):
+	"""
+	One recorded turn of the conversation. router_line is rendered once, when the turn is recorded.
+	"""
+	user_prompt: str
+	agent_response: str
+	tool_used: str
+	router_line: str
+
+	@classmethod
+	def create(cls, user_prompt: str, agent_response: str, tool_used: str) -> "HistoryItem":
+		"""
+		Records a turn; agent_response is stripped and truncated to 300 chars here, once.
+		"""
+		agent_response = _truncate(agent_response.strip(), 300)
+		return cls(user_prompt, agent_response, tool_used, format_history_line(user_prompt, agent_response, tool_used))
+
+
+def _truncate(text: str, limit: int) -> str:
+	return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def initialize_agent(legajo: str, llm: OllamaLLM, router_llm: Optional[OllamaLLM] = None):
 	"""
 	Initializes the agent runtime for a given student legajo and LLM.
+	router_llm picks the tool (see build_router_llm); llm is used for it when not given.
 	Returns a callable handle_query(user_text: str) -> str that selects and executes the right tool.
 	"""
+	if router_llm is None:
+		router_llm = llm
 	# Simple in-memory context for the current CLI session
 	pending: dict[str, str] = {"exercise_id": ""}
-	history: list[dict] = []
+	history: deque[HistoryItem] = deque(maxlen=HISTORY_SIZE)
+	speculative_retrieval = get_config().speculative_retrieval
+	prefetched: dict[str, Future] = {}
 	def tool_knowledge(term: str) -> str:
 		term_norm = (term or "").strip() or None
 		rows = get_student_knowledge(legajo, term_norm)
 		if not rows:
 			return "Sin registros de conocimiento."
-		lines = [f"{r['nombre']} ({r['topic_id']}): nivel {float(r['level']):.2f}" for r in rows]
-		return "\n".join(lines)
+		return "\n".join([_format_knowledge_row(**r) for r in rows])
 
 	def tool_summary(term: str) -> str:
 		term_norm = (term or "").strip() or None
 		rows = get_topic_summaries(legajo, term_norm)
 		if not rows:
 			return "Sin actividad para resumir."
-		lines = [
-			f"{r['nombre']} ({r['topic_id']}): sesiones {int(r['sessions'])}, "
-			f"respuestas {int(r['answers'])}, conf. prom {float(r['avg_conf']):.2f}, "
-			f"correctitud {float(r['correctness_rate']):.2f}, última {r['last_activity']}"
-			for r in rows
-		]
-		return "\n".join(lines)
+		return "\n".join([_format_summary_row(**r) for r in rows])
 
 	def tool_grade(payload: str) -> str:
 		ex_id = ""
 		answer_text = ""
 		try:
-			data = json.loads(payload)
+			data = _json_loads(payload)
 			ex_id = str(data.get("exercise_id") or "").strip()
 			answer_text = str(data.get("answer_text") or "").strip()
 		except Exception:
-			for line in (payload or "").splitlines():
-				if "exercise_id" in line:
-					ex_id = line.split(":", 1)[1].strip()
-				elif line.lower().startswith("answer") or line.lower().startswith("respuesta"):
-					answer_text = line.split(":", 1)[1].strip()
+			for m in _GRADE_FALLBACK_RE.finditer(payload or ""):
+				if m.group("ex") is not None:
+					ex_id = m.group("ex").strip()
+				else:
+					answer_text = m.group("ans").strip()
 		if not ex_id or not answer_text:
 			return "Formato inválido. Proporcione JSON {'exercise_id':'...','answer_text':'...'} o líneas 'exercise_id: ...' y 'answer: ...'."
 		res = grade_answer(legajo, ex_id, answer_text)
@@ -200,39 +578,28 @@ def initialize_agent(legajo: str, llm: OllamaLLM):
 			return f"No hay más ejercicios para tu nivel en el tema {res['topic_nombre']}."
 		
 		# Format exercises list in a clean, readable way
-		exercise_list = f"EJERCICIOS DISPONIBLES - {res['topic_nombre']}\n"
-		exercise_list += f"Tu nivel: {float(res['level']):.2f}\n\n"
-		
+		parts = [f"EJERCICIOS DISPONIBLES - {res['topic_nombre']}\nTu nivel: {float(res['level']):.2f}\n\n"]
 		for i, e in enumerate(exs, 1):
 			task_text = e.get('task', '').strip()
 			if task_text:
-				exercise_list += f"{i}. {task_text}\n"
-				exercise_list += f"   Dificultad: {float(e.get('difficulty', 0.0)):.2f} | ID: {e['id']}\n\n"
-		
-		exercise_list += "Escribe 'Dame un ejercicio de [tema]' para practicar con uno."
-		
-		return exercise_list
+				parts.append(_format_exercise_item(i=i, task=task_text, difficulty=float(e.get('difficulty', 0.0)), id=e['id']))
+		parts.append("Escribe 'Dame un ejercicio de [tema]' para practicar con uno.")
+		return "".join(parts)
 
 	def tool_ask_exercise(term: str) -> str:
 		"""
 		Pick one recommended exercise for the topic and store it as pending for grading.
 		"""
 		# Log the term being used for debugging
-		import sys
-		if sys.stdout.isatty():
+		if _DEBUG:
 			print(f"[DEBUG] tool_ask_exercise called with term: '{term}'", file=sys.stderr)
 		
-		# First, verify that the term can be mapped to a valid topic
-		from app.agent.tools import get_all_topics, find_topic_by_text
-		available_topics = get_all_topics()
-		topic_names = [t["nombre"].lower() for t in available_topics]
-		
 		# Try to find the topic
 		res = recommend_exercises(legajo, term, limit=5)
 		if not res.get("ok"):
 			error_msg = res.get("error") or "No se pudo recomendar ejercicios."
 			# Log the error for debugging
-			if sys.stdout.isatty():
+			if _DEBUG:
 				print(f"[DEBUG] recommend_exercises failed: {error_msg}", file=sys.stderr)
 			return error_msg
 		exs = res.get("exercises") or []
@@ -276,6 +643,20 @@ def initialize_agent(legajo: str, llm: OllamaLLM):
 		feedback += "Ejercicio completado. Si quieres practicar mas, pide otro ejercicio."
 		return feedback
 
+	def tool_summarize_topic(term: str) -> str:
+		return summarize_topic(llm, term)
+
+	# retrieve_docs (and any unknown tool) is answered with RAG in handle_query
+	tools: dict[str, Callable[[str], str]] = {
+		"knowledge_report": tool_knowledge,
+		"topic_summary": tool_summary,
+		"grade_exercise": tool_grade,
+		"recommend_exercises": tool_recommend,
+		"ask_exercise": tool_ask_exercise,
+		"grade_pending": tool_grade_pending,
+		"summarize_topic": tool_summarize_topic,
+	}
+
 	def route_tool(user_text: str) -> tuple[str, str]:
 		# CRITICAL: If there's a pending exercise, prioritize grade_pending
 		has_pending = pending.get("exercise_id", "").strip() != ""
@@ -284,28 +665,11 @@ def initialize_agent(legajo: str, llm: OllamaLLM):
 			# Check if user is explicitly asking for something else (like "dame otro ejercicio", "cambiar tema", etc.)
 			user_lower = user_text.lower().strip()
 			
-			# List of phrases that indicate user wants a NEW exercise or other action
-			explicit_requests = [
-				"dame otro", "dame otro ejercicio", "otro ejercicio", "cambiar", "nuevo ejercicio",
-				"ejercicio de", "dame un ejercicio", "quiero practicar", "ejercicios sobre", "ejercicios de",
-				"dame ejercicios", "lista de ejercicios", "muestrame ejercicios"
-			]
-			
-			# List of question patterns that indicate user is asking a question, not answering
-			question_patterns = [
-				"que es", "que son", "como funciona", "como se", "cual es", "cuales son",
-				"donde", "por que", "porque", "explica", "explicame", "dime sobre",
-				"cuenta sobre", "habla de", "resume", "muestra", "consulta"
-			]
-			
 			# Check if it's an explicit request for new exercise
-			is_explicit_new_exercise = any(phrase in user_lower for phrase in explicit_requests)
+			is_explicit_new_exercise = _NEW_EXERCISE_RE.search(user_lower) is not None
 			
 			# Check if it's a question (starts with question words or contains question patterns)
-			is_question = (
-				user_lower.startswith(("que", "como", "cual", "donde", "por que", "porque", "expl", "dime", "cuenta", "habla", "resume", "muestra", "consult")) or
-				any(pattern in user_lower for pattern in question_patterns)
-			)
+			is_question = _QUESTION_RE.search(user_lower) is not None
 			
 			# If user is NOT explicitly requesting a new exercise AND not asking a question,
 			# treat as answer to pending exercise
@@ -316,10 +680,18 @@ def initialize_agent(legajo: str, llm: OllamaLLM):
 				# User wants a new exercise, clear pending first
 				pending["exercise_id"] = ""
 		
+		fast = _fast_route(user_text)
+		if fast is not None:
+			return fast
+		
+		# Most LLM-routed turns end in retrieve_docs: start that retrieval while the router runs
+		if speculative_retrieval and not has_pending:
+			prefetched[user_text] = prefetch_documents(user_text)
+		
 		# Route strictly via LLM using recent context
 		try:
 			prompt = build_router_prompt(legajo, user_text, history, has_pending)
-			raw = llm.invoke(prompt)
+			raw = router_llm.invoke(prompt)
 			if not raw or not isinstance(raw, str):
 				# Fallback: if pending, treat as answer
 				if has_pending:
@@ -327,41 +699,27 @@ def initialize_agent(legajo: str, llm: OllamaLLM):
 				return "retrieve_docs", user_text
 			
 			try:
-				start = raw.find("{")
-				end = raw.rfind("}")
-				if start == -1 or end == -1 or start >= end:
+				parsed = _parse_router_output(raw)
+				if parsed is None:
 					# Fallback: if pending, treat as answer
 					if has_pending:
 						return "grade_pending", user_text
 					return "retrieve_docs", user_text
-				
-				obj = json.loads(raw[start : end + 1])
-				tool_name = str(obj.get("tool") or "").strip()
-				tool_input = obj.get("input")
-				if isinstance(tool_input, (dict, list)):
-					tool_input_str = json.dumps(tool_input, ensure_ascii=False)
-				else:
-					tool_input_str = str(tool_input or "").strip()
+				tool_name, tool_input_str = parsed
 				
 				# FINAL SAFETY CHECK: if there's a pending exercise and LLM selected ask_exercise,
 				# override it unless user was very explicit
 				if has_pending and tool_name == "ask_exercise":
 					# Only allow if user was very explicit about wanting a new exercise
-					user_lower = user_text.lower()
-					very_explicit = any(phrase in user_lower for phrase in [
-						"dame otro ejercicio", "otro ejercicio", "nuevo ejercicio",
-						"quiero practicar", "ejercicio de"
-					])
-					if not very_explicit:
+					if _VERY_EXPLICIT_NEW_EXERCISE_RE.search(user_text.lower()) is None:
 						# Override: treat as answer to pending
 						return "grade_pending", user_text
 				
-				if tool_name in {"knowledge_report", "topic_summary", "retrieve_docs", "grade_exercise", "recommend_exercises", "ask_exercise", "grade_pending", "summarize_topic"}:
+				if tool_name in _VALID_TOOLS:
 					return tool_name, tool_input_str
 			except (json.JSONDecodeError, KeyError, ValueError) as e:
 				# If JSON parsing fails, fall back to retrieve_docs or grade_pending
-				import sys
-				if sys.stdout.isatty():
+				if _IS_CLI:
 					print(f"Warning: Failed to parse LLM response as JSON: {e}", file=sys.stderr)
 				# If there's a pending exercise, treat as answer
 				if has_pending:
@@ -369,8 +727,7 @@ def initialize_agent(legajo: str, llm: OllamaLLM):
 				pass
 		except Exception as e:
 			# If LLM invocation fails, fall back to retrieve_docs or grade_pending
-			import sys
-			if sys.stdout.isatty():
+			if _IS_CLI:
 				print(f"Warning: LLM invocation failed: {e}", file=sys.stderr)
 			# If there's a pending exercise, treat as answer
 			if has_pending:
@@ -382,43 +739,48 @@ def initialize_agent(legajo: str, llm: OllamaLLM):
 			return "grade_pending", user_text
 		return "retrieve_docs", user_text
 
-	def handle_query(user_text: str) -> str:
-		import sys
+	def handle_query(user_text: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+		"""
+		Routes and answers user_text. If on_token is given, RAG answers are also passed to it
+		chunk by chunk while they are generated; the full text is returned either way.
+		"""
 		import traceback
-		# Only print if running in CLI mode (not in web server)
-		is_cli = sys.stdout.isatty()
 		
 		try:
-			if is_cli:
+			if _DEBUG:
 				print(f"Current memory: {pending}") 
 			tool_name, tool_input = route_tool(user_text)
 			# Log selected tool and truncated input
-			if is_cli:
-				preview = tool_input if len(tool_input) <= 120 else (tool_input[:117] + "...")
+			if _DEBUG:
+				preview = _truncate(tool_input, 120)
 				print(f"[tool] seleccionado={tool_name} input={preview}")
 			
+			# Retrieval speculatively started by route_tool, if any; unused prefetches are dropped
+			docs_future = prefetched.pop(user_text, None)
+			prefetched.clear()
+			
 			response_text = ""
 			try:
-				if tool_name == "knowledge_report":
-					response_text = tool_knowledge(tool_input)
-				elif tool_name == "topic_summary":
-					response_text = tool_summary(tool_input)
-				elif tool_name == "grade_exercise":
-					response_text = tool_grade(tool_input)
-				elif tool_name == "recommend_exercises":
-					response_text = tool_recommend(tool_input)
-				elif tool_name == "ask_exercise":
-					response_text = tool_ask_exercise(tool_input)
-				elif tool_name == "grade_pending":
-					response_text = tool_grade_pending(tool_input)
-				elif tool_name == "summarize_topic":
-					response_text = summarize_with_validation(llm, tool_input or user_text, max_sources=5)
+				tool_fn = tools.get(tool_name)
+				if tool_fn is not None:
+					if tool_name == "summarize_topic" and not tool_input:
+						tool_input = user_text
+					response_text = tool_fn(tool_input)
+				elif on_token is not None:
+					parts: List[str] = []
+					for chunk in stream_answer_with_rag(llm, user_text, docs_future):
+						parts.append(chunk)
+						on_token(chunk)
+					response_text = "".join(parts)
+					if _IS_CLI:
+						# End the streamed line before the context logs below
+						print()
 				else:
-					response_text = answer_with_rag(llm, user_text)
+					response_text = answer_with_rag(llm, user_text, docs_future)
 			except Exception as e:
 				# If tool execution fails, return error message
 				error_msg = f"Error al ejecutar la herramienta {tool_name}: {str(e)}"
-				if is_cli:
+				if _IS_CLI:
 					print(f"ERROR: {error_msg}", file=sys.stderr)
 					traceback.print_exc()
 				response_text = error_msg
@@ -428,31 +790,27 @@ def initialize_agent(legajo: str, llm: OllamaLLM):
 				response_text = "Lo siento, no pude generar una respuesta. Por favor intenta de nuevo."
 			
 			# Log current context (before sending response) - only in CLI mode
-			if is_cli:
+			if _DEBUG:
 				print("[context] recent (max 6):")
-				for i, item in enumerate(history[-6:], start=1):
-					up = (item.get("user_prompt") or "").strip()
-					tu = (item.get("tool_used") or "").strip() or "desconocido"
-					ar = (item.get("agent_response") or "").strip()
-					if len(ar) > 120:
-						ar = ar[:117] + "..."
+				for i, item in enumerate(history, start=1):
+					up = item.user_prompt.strip()
+					tu = item.tool_used.strip() or "desconocido"
+					ar = _truncate(item.agent_response.strip(), 120)
 					print(f"  {i}. U: {up} | Tool: {tu} | A: {ar}")
 				print(f"[context] pending: {pending}")
 			
-			# Update conversation history (cap at 6)
-			history.append({
-				"user_prompt": user_text,
-				"agent_response": response_text if len(response_text) <= 300 else (response_text[:297] + "..."),
-				"tool_used": tool_name,
-			})
-			if len(history) > 6:
-				del history[:-6]
+			# Update conversation history (the deque drops the oldest turn past HISTORY_SIZE)
+			history.append(HistoryItem.create(
+				user_prompt=user_text,
+				agent_response=response_text,
+				tool_used=tool_name,
+			))
 			
 			return response_text
 		except Exception as e:
 			# Final fallback - ensure we always return a string
 			error_msg = f"Error procesando la consulta: {str(e)}"
-			if is_cli:
+			if _IS_CLI:
 				print(f"FATAL ERROR: {error_msg}", file=sys.stderr)
 				traceback.print_exc()
 			return error_msg
@@ -460,32 +818,78 @@ def initialize_agent(legajo: str, llm: OllamaLLM):
 	return handle_query
 
 
+# Lines pasted between two of these are answered together by answer_many_with_rag
+_MULTILINE_SENTINEL = '"""'
+
+
+def _read_multiline_block() -> List[str]:
+	questions: List[str] = []
+	while True:
+		line = input("... ").strip()
+		if line == _MULTILINE_SENTINEL:
+			return questions
+		if line:
+			questions.append(line)
+
+
 def main() -> None:
 	cfg = get_config()
 	if not (cfg.neo4j_uri and cfg.neo4j_user and cfg.neo4j_password):
 		print("Missing Neo4j config. Set NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD in .env", file=sys.stderr)
 		sys.exit(1)
 
+	# Index creation and LLM setup run in the background while the user types the legajo
+	startup = ThreadPoolExecutor(max_workers=4, thread_name_prefix="startup")
 	# Try to create vector indexes (safe to call multiple times)
-	ensure_vector_indexes()
+	indexes_future = startup.submit(ensure_vector_indexes)
+	llm_future = startup.submit(build_llm)
+	router_llm_future = startup.submit(build_router_llm)
+	# A dedicated router model is usually not pulled by hand; fetch it before the first query
+	router_pull_future = startup.submit(ensure_ollama_model, cfg.router_model) if cfg.router_model else None
 
 	legajo = input("Ingrese su legajo: ").strip()
 	upsert_student(legajo)
-	llm = build_llm()
-
-	handle_query = initialize_agent(legajo, llm)
+	llm = llm_future.result()
+	router_llm = router_llm_future.result()
+	indexes_future.result()
+	if router_pull_future is not None:
+		router_pull_future.result()
+	# Have Ollama load the model now, so the first real query does not pay for it
+	startup.submit(router_llm.invoke, "ping")
+	if cfg.router_model and cfg.router_model != cfg.ollama_model:
+		startup.submit(llm.invoke, "ping")
+	startup.shutdown(wait=False)
+
+	handle_query = initialize_agent(legajo, llm, router_llm)
 
 	print("Agent listo. Escribe tu consulta en lenguaje natural (escribe 'salir' para terminar).")
+	print(f'Para hacer varias preguntas conceptuales juntas, pégalas entre dos líneas {_MULTILINE_SENTINEL}.')
 	while True:
 		line = input("\n> ").strip()
 		if not line:
 			continue
 		if line.lower() in ("salir", "exit", "quit"):
 			break
+		if line == _MULTILINE_SENTINEL:
+			questions = _read_multiline_block()
+			try:
+				for i, answer in enumerate(answer_many_with_rag(llm, questions), start=1):
+					print(f"\n[{i}] {questions[i - 1]}\n{answer}")
+			except Exception as e:
+				print(f"Ocurrió un error procesando las consultas: {e}")
+			continue
 		try:
-			
-			response = handle_query(line)
-			print(response)
+			streamed: List[str] = []
+
+			def write_token(chunk: str) -> None:
+				streamed.append(chunk)
+				sys.stdout.write(chunk)
+				sys.stdout.flush()
+
+			response = handle_query(line, on_token=write_token)
+			# Streamed answers were already written token by token
+			if not streamed:
+				print(response)
 		except Exception as e:
 			print(f"Ocurrió un error procesando la consulta: {e}")
 
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+
+def _normalize(vec: List[float]) -> np.ndarray:
+	arr = np.asarray(vec, dtype=np.float32)
+	norm = float(np.linalg.norm(arr))
+	if norm == 0:
+		return arr
+	return arr / norm
+
+
+class SemanticCache:
+	"""
+	In-memory LRU cache keyed by embeddings, with TTL.
+	A lookup returns the cached value of the most similar entry if its cosine similarity is >= threshold.
+	Entries are stored as unit float32 rows; a lookup is one matrix-vector product over all of them.
+	Safe to share between threads (the server runs turns in worker threads).
+	"""
+
+	def __init__(self, threshold: float = 0.93, max_size: int = 256, ttl_seconds: float = 3600.0) -> None:
+		self.threshold = threshold
+		self.max_size = max_size
+		self.ttl_seconds = ttl_seconds
+		self._entries: "OrderedDict[int, Tuple[np.ndarray, Any, float]]" = OrderedDict()
+		self._next_key = 0
+		# Stacked (keys, matrix) view of the entries, rebuilt lazily after put/evict/clear
+		self._stacked: Optional[Tuple[List[int], np.ndarray]] = None
+		self._lock = threading.Lock()
+
+	def _matrix(self) -> Tuple[List[int], np.ndarray]:
+		if self._stacked is None:
+			keys = list(self._entries)
+			self._stacked = (keys, np.stack([self._entries[k][0] for k in keys]))
+		return self._stacked
+
+	def _evict_expired(self) -> None:
+		now = time.monotonic()
+		expired = [k for k, (_, _, ts) in self._entries.items() if now - ts > self.ttl_seconds]
+		for k in expired:
+			del self._entries[k]
+		if expired:
+			self._stacked = None
+
+	def search(self, vec: List[float]) -> Tuple[Optional[Any], float]:
+		"""
+		Returns (value, similarity) for the nearest cached entry, or (None, best_similarity) on a miss.
+		"""
+		if not vec:
+			return None, 0.0
+		q = _normalize(vec)
+		with self._lock:
+			self._evict_expired()
+			if not self._entries:
+				return None, 0.0
+			keys, mat = self._matrix()
+			if mat.shape[1] != q.shape[0]:
+				return None, 0.0
+			sims = mat @ q
+			best = int(np.argmax(sims))
+			best_key, best_sim = keys[best], float(sims[best])
+			if best_sim < self.threshold:
+				return None, max(best_sim, 0.0)
+			self._entries.move_to_end(best_key)
+			return self._entries[best_key][1], best_sim
+
+	def put(self, vec: List[float], value: Any) -> None:
+		if not vec:
+			return
+		row = _normalize(vec)
+		with self._lock:
+			self._entries[self._next_key] = (row, value, time.monotonic())
+			self._next_key += 1
+			while len(self._entries) > self.max_size:
+				self._entries.popitem(last=False)
+			self._stacked = None
+
+	def clear(self) -> None:
+		with self._lock:
+			self._entries.clear()
+			self._stacked = None
+
+	def __len__(self) -> int:
+		return len(self._entries)
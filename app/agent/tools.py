@@ -1,27 +1,172 @@
 from __future__ import annotations
 
-import math
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any, Dict, List, Optional, Tuple
 from datetime import date
 
-from neo4j.exceptions import Neo4jError
+import numpy as np
+from neo4j.exceptions import ClientError, Neo4jError
+
+try:
+	import faiss
+except ImportError:  # pragma: no cover - faiss is optional
+	faiss = None
 
 from app.config import get_config
-from app.db.neo4j_client import run_query
+from app.db.neo4j_client import run_autocommit_query, run_query, run_query_batch, run_write
 from app.embeddings.ollama_embeddings import OllamaEmbeddingClient
-from app.background.knowledge import update_student_topic_level
+from app.embeddings.cache import EmbeddingCache, cache_key, normalize_text
+from app.background.knowledge import update_level_query
 import json
 
-_embed = OllamaEmbeddingClient()
+# Debug output is only printed in CLI mode (not in the web server) and with AGENT_DEBUG set
+_DEBUG = sys.stdout.isatty() and get_config().agent_debug
+
+_embed: Optional[OllamaEmbeddingClient] = None
+# Runs the document search of gather_sources_for_summary next to the section search
+_search_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="source-search")
+_embed_cache: Optional[EmbeddingCache] = None
+# Single-flight: cache key -> Future of an embedding request already in progress
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def _get_embed() -> OllamaEmbeddingClient:
+	"""
+	Process-wide embedding client (one HTTP session/pool), created on first use so importing tools does no setup.
+	"""
+	global _embed
+	if _embed is None:
+		_embed = OllamaEmbeddingClient()
+	return _embed
+
+
+def _get_embed_cache() -> EmbeddingCache:
+	global _embed_cache
+	if _embed_cache is None:
+		cfg = get_config()
+		_embed_cache = EmbeddingCache(
+			max_size=cfg.embedding_cache_size,
+			db_path=cfg.embedding_cache_path or None,
+		)
+	return _embed_cache
+
+
+class _VectorStore:
+	"""
+	In-memory copy of one label's vectors for the in-app similarity fallback:
+	an (N, D) float32 matrix of unit rows plus the parallel ids and names.
+	Loaded from Neo4j on first use and reloaded after ttl_seconds or invalidate().
+	If faiss is installed, searches go through an exact IndexFlatIP over the same rows.
+	"""
+
+	def __init__(self, label: str, ttl_seconds: float = 300.0) -> None:
+		self.label = label
+		self.ttl_seconds = ttl_seconds
+		self.ids: List[str] = []
+		self.names: List[str] = []
+		self.mat: Optional[np.ndarray] = None
+		self.index = None
+		self._loaded_at = 0.0
+		self._lock = threading.Lock()
+
+	def invalidate(self) -> None:
+		with self._lock:
+			self.mat = None
+
+	def _load(self) -> None:
+		cypher = f"""
+		MATCH (n:{self.label})
+		WHERE n.vector IS NOT NULL
+		RETURN n.id AS id, n.nombre AS nombre, n.vector AS vec
+		"""
+		records = run_query(cypher, {})
+		dim = len(records[0]["vec"]) if records else 0
+		# Skip vectors from a different embedding model, they cannot be stacked or compared
+		rows = [r for r in records if len(r["vec"]) == dim]
+		self.ids = [r["id"] for r in rows]
+		self.names = [r.get("nombre") or "" for r in rows]
+		mat = np.asarray([r["vec"] for r in rows], dtype=np.float32).reshape(len(rows), dim)
+		norms = np.linalg.norm(mat, axis=1, keepdims=True)
+		self.mat = np.divide(mat, norms, out=np.zeros_like(mat), where=norms != 0)
+		self.index = None
+		if faiss is not None and rows:
+			self.index = faiss.IndexFlatIP(dim)
+			self.index.add(self.mat)
+		self._loaded_at = time.monotonic()
+
+	def top_k(self, q_vec: List[float], top_k: int) -> List[Tuple[str, float, str]]:
+		"""
+		Returns (id, cosine similarity, nombre) of the top_k most similar nodes, best first.
+		"""
+		with self._lock:
+			if self.mat is None or time.monotonic() - self._loaded_at > self.ttl_seconds:
+				self._load()
+			mat, index, ids, names = self.mat, self.index, self.ids, self.names
+		q = np.asarray(q_vec, dtype=np.float32)
+		q_norm = np.linalg.norm(q)
+		if top_k <= 0 or len(ids) == 0 or q.shape[0] != mat.shape[1] or q_norm == 0:
+			return []
+		q = q / q_norm
+		k = min(top_k, len(ids))
+		if index is not None:
+			scores, idx = index.search(q.reshape(1, -1), k)
+			return [(ids[i], float(sim), names[i]) for i, sim in zip(idx[0], scores[0]) if i >= 0]
+		sims = mat @ q
+		idx = np.argpartition(-sims, k - 1)[:k]
+		idx = idx[np.argsort(-sims[idx])]
+		return [(ids[i], float(sims[i]), names[i]) for i in idx]
 
 
-def _cosine(a: List[float], b: List[float]) -> float:
-	dot = sum(x * y for x, y in zip(a, b))
-	norm_a = math.sqrt(sum(x * x for x in a))
-	norm_b = math.sqrt(sum(y * y for y in b))
-	if norm_a == 0 or norm_b == 0:
-		return 0.0
-	return dot / (norm_a * norm_b)
+_vector_stores: Dict[str, _VectorStore] = {
+	label: _VectorStore(label) for label in ("Topic", "Document", "Section", "Exercise")
+}
+
+
+def invalidate_vector_stores() -> None:
+	"""
+	Makes the in-app fallback reload vectors from Neo4j on its next search.
+	"""
+	for store in _vector_stores.values():
+		store.invalidate()
+
+
+# Vector indexes whose query failed; in auto mode they are not queried again in this process
+_missing_vector_indexes: set = set()
+
+
+def _use_vector_index(index_name: str) -> bool:
+	use_index = get_config().use_vector_index
+	if use_index is None:
+		# Auto-detect: try the index until a query on it fails
+		return index_name not in _missing_vector_indexes
+	return use_index
+
+
+def normalize_stored_vectors(batch_size: int = 1000) -> None:
+	"""
+	One-time migration (scripts/normalize_vectors.py): rescales every stored node vector to unit length.
+	Only data written before embeddings were stored unit-length needs it; vectors that already are
+	unit-length are left untouched. Commits every batch_size nodes.
+	"""
+	match = """
+	MATCH (n)
+	WHERE n.vector IS NOT NULL
+	WITH n, reduce(sq = 0.0, x IN n.vector | sq + x * x) AS sq
+	WHERE sq > 0 AND abs(sq - 1.0) > 1e-4
+	"""
+	update = "SET n.vector = [x IN n.vector | x / sqrt(sq)]"
+	try:
+		run_autocommit_query(f"{match}\nCALL {{ WITH n, sq {update} }} IN TRANSACTIONS OF {int(batch_size)} ROWS")
+	except ClientError as e:
+		# Neo4j < 4.4: no IN TRANSACTIONS, a single transaction instead
+		if e.code != "Neo.ClientError.Statement.SyntaxError":
+			raise
+		run_write(f"{match}\n{update}")
+	invalidate_vector_stores()
 
 
 def ensure_vector_indexes() -> None:
@@ -29,7 +174,7 @@ def ensure_vector_indexes() -> None:
 	Create vector indexes if supported by the DB. Uses detected embedding dimension.
 	Tries Aura-style key names first; falls back to legacy config keys if needed.
 	"""
-	dimension = _embed.detect_dimension()
+	dimension = _get_embed().detect_dimension()
 	indexes = [
 		("topic_vector", "Topic", "vector"),
 		("document_vector", "Document", "vector"),
@@ -50,6 +195,7 @@ def ensure_vector_indexes() -> None:
 		"""
 		try:
 			run_query(cypher, {"dim": dimension})
+			_missing_vector_indexes.discard(name)
 			continue
 		except Neo4jError:
 			# fallback to legacy key names
@@ -65,156 +211,165 @@ def ensure_vector_indexes() -> None:
 			"""
 			try:
 				run_query(legacy_cypher, {"dim": dimension})
+				_missing_vector_indexes.discard(name)
 			except Neo4jError:
 				# Ignore if not supported; the app will fall back to in-app similarity.
 				pass
 
 
-def vector_search_documents(question: str, top_k: int = 5) -> List[Dict[str, Any]]:
+def _too_short(text: Optional[str]) -> bool:
 	"""
-	Returns a list of documents with optional sections:
-	[{id, nombre, content, score, sections: [{id, content}]}]
+	True for empty/whitespace or very short search texts, which are not worth an embedding request.
 	"""
-	cfg = get_config()
-	q_vec = _embed.embed(question)
+	return len(normalize_text(text or "")) < get_config().min_query_chars
 
-	results: List[Tuple[str, float]] = []
 
-	use_index = cfg.use_vector_index
-	if use_index is None:
-		# Auto-detect by attempting a vector query
-		use_index = True
+def embed_query(text: str) -> List[float]:
+	"""
+	Embeds a user query with the shared embedding client.
+	Whitespace-normalized queries are cached (SHA-256 keyed LRU) so repeats skip the Ollama call.
+	"""
+	return embed_queries([text])[0]
 
-	if use_index:
+
+def embed_queries(texts: List[str]) -> List[List[float]]:
+	"""
+	Batched variant of embed_query: cache misses are embedded together in a single request.
+	Misses already being embedded by another thread wait for that request instead of repeating it.
+	"""
+	cache = _get_embed_cache()
+	norm = [normalize_text(t) for t in texts]
+	keys = [cache_key(_get_embed().model, t) for t in norm]
+	out: List[Optional[List[float]]] = [cache.get(k) for k in keys]
+	missing = [i for i, v in enumerate(out) if v is None]
+	if missing:
+		# Claim the keys nobody is embedding yet (repeated texts collapse into one key)
+		texts_by_key = {keys[i]: norm[i] for i in missing}
+		owned: Dict[str, Future] = {}
+		futures: Dict[str, Future] = {}
+		with _inflight_lock:
+			for k in texts_by_key:
+				fut = _inflight.get(k)
+				if fut is None:
+					fut = _inflight[k] = owned[k] = Future()
+				futures[k] = fut
+		if owned:
+			owned_keys = list(owned)
+			try:
+				vectors = _get_embed().embed_batch([texts_by_key[k] for k in owned_keys])
+			except BaseException as exc:
+				with _inflight_lock:
+					for k in owned_keys:
+						_inflight.pop(k, None)
+				for k in owned_keys:
+					owned[k].set_exception(exc)
+				raise
+			for k, vec in zip(owned_keys, vectors):
+				cache.put(k, vec)
+			with _inflight_lock:
+				for k in owned_keys:
+					_inflight.pop(k, None)
+			for k, vec in zip(owned_keys, vectors):
+				owned[k].set_result(vec)
+		for i in missing:
+			out[i] = futures[keys[i]].result()
+	return out  # type: ignore[return-value]
+
+
+def _vector_search(index_name: str, label: str, q_vec: List[float], top_k: int, hydrate: str) -> List[Any]:
+	"""
+	Ranks label nodes by similarity to q_vec and hydrates them in the same query.
+	hydrate is the Cypher tail applied to each hit (n, score); it must return rows ordered by score.
+	Uses the Neo4j vector index when available, else the in-app vector store plus one hydration query.
+	"""
+	if _use_vector_index(index_name):
 		try:
-			cypher = """
-			CALL db.index.vector.queryNodes('document_vector', $k, $vec)
-			YIELD node, score
-			RETURN node.id AS id, score
+			cypher = f"""
+			CALL db.index.vector.queryNodes('{index_name}', $k, $vec)
+			YIELD node AS n, score
+			{hydrate}
 			"""
 			records = run_query(cypher, {"k": top_k, "vec": q_vec})
-			results = [(r["id"], r["score"]) for r in records]
+			if records:
+				return records
 		except Neo4jError:
-			# Fallback to in-app similarity
-			results = []
-
-	if not results:
-		# in-app similarity: fetch docs with vectors and compute
-		cypher = """
-		MATCH (d:Document)
-		WHERE exists(d.vector) AND d.vector IS NOT NULL
-		RETURN d.id AS id, d.vector AS vec
-		"""
-		records = run_query(cypher, {})
-		candidates: List[Tuple[str, float]] = []
-		for r in records:
-			doc_id = r["id"]
-			vec = r["vec"]
-			sim = _cosine(q_vec, vec)
-			candidates.append((doc_id, sim))
-		candidates.sort(key=lambda x: x[1], reverse=True)
-		results = candidates[:top_k]
-
-	if not results:
+			_missing_vector_indexes.add(index_name)
+
+	hits = _vector_stores[label].top_k(q_vec, top_k)
+	if not hits:
 		return []
+	cypher = f"""
+	UNWIND $hits AS hit
+	MATCH (n:{label} {{id: hit.id}})
+	WITH n, hit.score AS score
+	{hydrate}
+	"""
+	return run_query(cypher, {"hits": [{"id": node_id, "score": sim} for node_id, sim, _ in hits]})
 
-	doc_ids = [doc_id for doc_id, _ in results]
-	cypher = """
-	MATCH (d:Document) WHERE d.id IN $ids
-	OPTIONAL MATCH (d)-[:HAS_SECTION]->(s:Section)
-	RETURN d.id AS id, d.nombre AS nombre, d.content AS content, collect({id: s.id, content: s.content}) AS sections
-	"""
-	records = run_query(cypher, {"ids": doc_ids})
-	doc_map: Dict[str, Dict[str, Any]] = {}
-	for r in records:
-		doc_map[r["id"]] = {
+
+_HYDRATE_DOCUMENTS = """
+	OPTIONAL MATCH (n)-[:HAS_SECTION]->(s:Section)
+	WITH n, score, collect({id: s.id, content: s.content}) AS sections
+	RETURN n.id AS id, n.nombre AS nombre, n.content AS content, sections, score
+	ORDER BY score DESC
+"""
+
+
+def vector_search_documents(question: str, top_k: int = 5, q_vec: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+	"""
+	Returns a list of documents with optional sections:
+	[{id, nombre, content, score, sections: [{id, content}]}]
+	Pass q_vec to reuse an embedding already computed for the question.
+	"""
+	if q_vec is None:
+		if _too_short(question):
+			return []
+		q_vec = embed_query(question)
+	records = _vector_search("document_vector", "Document", q_vec, top_k, _HYDRATE_DOCUMENTS)
+	return [
+		{
 			"id": r["id"],
 			"nombre": r.get("nombre") or "",
 			"content": r.get("content") or "",
 			"sections": [s for s in r["sections"] if s["id"] is not None],
+			"score": float(r["score"]),
 		}
-
-	# attach scores preserving order
-	out: List[Dict[str, Any]] = []
-	for doc_id, score in results:
-		if doc_id in doc_map:
-			item = doc_map[doc_id]
-			item["score"] = float(score)
-			out.append(item)
-	return out
+		for r in records
+	]
 
 
 def cypher_query_tool(query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-	records = run_query(query, params or {})
-	return [dict(r) for r in records]
+	return run_query(query, params or {}, as_dict=True)
 
-def vector_search_sections(question: str, top_k: int = 8) -> List[Dict[str, Any]]:
+_HYDRATE_SECTIONS = """
+	OPTIONAL MATCH (d:Document)-[:HAS_SECTION]->(n)
+	WITH n, score, head(collect(d)) AS d
+	RETURN n.id AS id, n.content AS content, d.id AS parent_id, d.nombre AS parent_nombre, score
+	ORDER BY score DESC
+"""
+
+
+def vector_search_sections(question: str, top_k: int = 8, q_vec: Optional[List[float]] = None) -> List[Dict[str, Any]]:
 	"""
 	Returns a list of sections and their parent document:
 	[{id, content, parent_id, parent_nombre, score}]
-	"""
-	cfg = get_config()
-	q_vec = _embed.embed(question)
-
-	results: List[Tuple[str, float]] = []
-
-	use_index = cfg.use_vector_index
-	if use_index is None:
-		use_index = True
-
-	if use_index:
-		try:
-			cypher = """
-			CALL db.index.vector.queryNodes('section_vector', $k, $vec)
-			YIELD node, score
-			RETURN node.id AS id, score
-			"""
-			records = run_query(cypher, {"k": top_k, "vec": q_vec})
-			results = [(r["id"], r["score"]) for r in records]
-		except Neo4jError:
-			results = []
-
-	if not results:
-		cypher = """
-		MATCH (s:Section)
-		WHERE exists(s.vector) AND s.vector IS NOT NULL
-		RETURN s.id AS id, s.vector AS vec
-		"""
-		records = run_query(cypher, {})
-		candidates: List[Tuple[str, float]] = []
-		for r in records:
-			sec_id = r["id"]
-			vec = r["vec"]
-			sim = _cosine(q_vec, vec)
-			candidates.append((sec_id, sim))
-		candidates.sort(key=lambda x: x[1], reverse=True)
-		results = candidates[:top_k]
-
-	if not results:
-		return []
-
-	sec_ids = [sid for sid, _ in results]
-	cypher = """
-	MATCH (s:Section) WHERE s.id IN $ids
-	OPTIONAL MATCH (d:Document)-[:HAS_SECTION]->(s)
-	RETURN s.id AS id, s.content AS content, d.id AS parent_id, d.nombre AS parent_nombre
-	"""
-	records = run_query(cypher, {"ids": sec_ids})
-	sec_map: Dict[str, Dict[str, Any]] = {}
-	for r in records:
-		sec_map[r["id"]] = {
+	Pass q_vec to reuse an embedding already computed for the question.
+	"""
+	if q_vec is None:
+		if _too_short(question):
+			return []
+		q_vec = embed_query(question)
+	records = _vector_search("section_vector", "Section", q_vec, top_k, _HYDRATE_SECTIONS)
+	return [
+		{
 			"id": r["id"],
 			"content": r.get("content") or "",
 			"parent_id": r.get("parent_id"),
 			"parent_nombre": r.get("parent_nombre") or "",
+			"score": float(r["score"]),
 		}
-	out: List[Dict[str, Any]] = []
-	for sec_id, score in results:
-		if sec_id in sec_map:
-			item = sec_map[sec_id]
-			item["score"] = float(score)
-			out.append(item)
-	return out
+		for r in records
+	]
 
 def gather_sources_for_summary(query: str, k_docs: int = 5, k_sections: int = 8, max_sources: int = 5) -> List[Dict[str, Any]]:
 	"""
@@ -222,8 +377,13 @@ def gather_sources_for_summary(query: str, k_docs: int = 5, k_sections: int = 8,
 	- If both a section and its parent document match, keep the section and drop the doc.
 	Returns entries: [{type, id, title, content, score}]
 	"""
-	doc_hits = vector_search_documents(query, top_k=k_docs)
-	sec_hits = vector_search_sections(query, top_k=k_sections)
+	# Embed once; the two searches are independent Neo4j round-trips, so run them concurrently
+	if _too_short(query):
+		return []
+	q_vec = embed_query(query)
+	doc_future = _search_pool.submit(vector_search_documents, query, k_docs, q_vec)
+	sec_hits = vector_search_sections(query, top_k=k_sections, q_vec=q_vec)
+	doc_hits = doc_future.result()
 
 	# Build sets to drop parent docs when a section hit exists
 	parent_doc_ids = set([s["parent_id"] for s in sec_hits if s.get("parent_id")])
@@ -269,14 +429,10 @@ def find_topic_by_text(text: str, min_similarity: float = 0.9) -> Optional[Dict[
 		text: The text to search for
 		min_similarity: Minimum similarity score (0.0-1.0) required to return a topic. Default: 0.8
 	"""
-	import sys
-	cfg = get_config()
-	q_vec = _embed.embed(text)
-	use_index = cfg.use_vector_index
-	if use_index is None:
-		use_index = True
-	# Try vector index
-	if use_index:
+	if _too_short(text):
+		return None
+	q_vec = embed_query(text)
+	if _use_vector_index("topic_vector"):
 		try:
 			cypher = """
 			CALL db.index.vector.queryNodes('topic_vector', 1, $vec)
@@ -290,41 +446,31 @@ def find_topic_by_text(text: str, min_similarity: float = 0.9) -> Optional[Dict[
 				topic_name = first.get("nombre") or ""
 				# Only return if similarity meets threshold
 				if score >= min_similarity:
-					if sys.stdout.isatty():
+					if _DEBUG:
 						print(f"[DEBUG] find_topic_by_text('{text}') -> '{topic_name}' (score: {score:.3f} >= {min_similarity})", file=sys.stderr)
 					return {"id": first["id"], "nombre": topic_name, "score": score}
 				else:
-					if sys.stdout.isatty():
+					if _DEBUG:
 						print(f"[DEBUG] find_topic_by_text('{text}') -> '{topic_name}' REJECTED (score: {score:.3f} < {min_similarity})", file=sys.stderr)
 					return None
 		except Neo4jError:
-			pass
-	# Fallback in-app cosine
-	cypher = """
-	MATCH (t:Topic)
-	WHERE exists(t.vector) AND t.vector IS NOT NULL
-	RETURN t.id AS id, t.nombre AS nombre, t.vector AS vec
-	"""
-	candidates: List[Tuple[str, float, str]] = []
-	for r in run_query(cypher, {}):
-		vec = r["vec"]
-		sim = _cosine(q_vec, vec)
-		candidates.append((r["id"], sim, r.get("nombre") or ""))
+			_missing_vector_indexes.add("topic_vector")
+	# Fallback in-app cosine; top 3 are kept for the debug output
+	candidates = _vector_stores["Topic"].top_k(q_vec, 3)
 	if not candidates:
-		if sys.stdout.isatty():
+		if _DEBUG:
 			print(f"[DEBUG] find_topic_by_text('{text}') -> NO CANDIDATES FOUND", file=sys.stderr)
 		return None
-	candidates.sort(key=lambda x: x[1], reverse=True)
 	top = candidates[0]
 	score = top[1]
 	topic_name = top[2]
 	# Only return if similarity meets threshold
 	if score >= min_similarity:
-		if sys.stdout.isatty():
+		if _DEBUG:
 			print(f"[DEBUG] find_topic_by_text('{text}') -> '{topic_name}' (score: {score:.3f} >= {min_similarity})", file=sys.stderr)
 		return {"id": top[0], "nombre": topic_name, "score": float(score)}
 	else:
-		if sys.stdout.isatty():
+		if _DEBUG:
 			print(f"[DEBUG] find_topic_by_text('{text}') -> '{topic_name}' REJECTED (score: {score:.3f} < {min_similarity})", file=sys.stderr)
 			# Show top 3 candidates for debugging
 			top_3 = [(name, f"{sim:.3f}") for _, sim, name in candidates[:3]]
@@ -332,6 +478,46 @@ def find_topic_by_text(text: str, min_similarity: float = 0.9) -> Optional[Dict[
 		return None
 
 
+def load_topic_vectors() -> Tuple[List[str], np.ndarray]:
+	"""
+	Reads every Topic vector once.
+	Returns (ids, (K, D) float32 matrix with L2-normalized rows).
+	"""
+	records = run_query("MATCH (t:Topic) WHERE t.vector IS NOT NULL RETURN t.id AS id, t.vector AS vector", {}, write=False)
+	if not records:
+		return [], np.empty((0, 0), dtype=np.float32)
+	ids = [r["id"] for r in records]
+	mat = np.asarray([r["vector"] for r in records], dtype=np.float32)
+	norms = np.linalg.norm(mat, axis=1, keepdims=True)
+	mat /= np.where(norms == 0, 1, norms)
+	return ids, mat
+
+
+def find_best_topics_for_exercises(
+	exercise_vectors: List[List[float]],
+	topic_ids: List[str],
+	topic_matrix: np.ndarray,
+	default_topic_id: str,
+	min_similarity: float = 0.7,
+) -> List[str]:
+	"""
+	Best Topic id for each already-embedded exercise, scored with a single (N, D) @ (D, K) product.
+	Exercises with no topic at or above min_similarity get default_topic_id.
+	topic_ids/topic_matrix come from load_topic_vectors.
+	"""
+	if not exercise_vectors:
+		return []
+	mat = np.asarray(exercise_vectors, dtype=np.float32)
+	if not topic_ids or mat.shape[1] != topic_matrix.shape[1]:
+		return [default_topic_id] * len(exercise_vectors)
+	norms = np.linalg.norm(mat, axis=1, keepdims=True)
+	mat /= np.where(norms == 0, 1, norms)
+	sims = mat @ topic_matrix.T
+	best = sims.argmax(axis=1)
+	found = sims[np.arange(len(best)), best] >= min_similarity
+	return [topic_ids[i] if ok else default_topic_id for i, ok in zip(best.tolist(), found.tolist())]
+
+
 def get_student_knowledge(legajo: str, topic_term: Optional[str] = None) -> List[Dict[str, Any]]:
 	"""
 	Returns knowledge levels for topics where the student has a KNOWS relation.
@@ -343,8 +529,7 @@ def get_student_knowledge(legajo: str, topic_term: Optional[str] = None) -> List
 	RETURN t.id AS topic_id, t.nombre AS nombre, r.level AS level
 	ORDER BY level DESC
 	"""
-	records = run_query(cypher, {"legajo": legajo, "term": topic_term})
-	return [dict(r) for r in records]
+	return run_query(cypher, {"legajo": legajo, "term": topic_term}, as_dict=True)
 
 def get_all_topics() -> List[Dict[str, str]]:
 	"""
@@ -360,80 +545,35 @@ def get_all_topics() -> List[Dict[str, str]]:
 	return [{"id": r["id"], "nombre": r.get("nombre") or ""} for r in records]
 
 
+_HYDRATE_EXERCISES = """
+	MATCH (n)-[:BELONGS_TO]->(t:Topic)
+	WITH n, score, head(collect(t)) AS t
+	RETURN n.id AS id, n.task AS task, n.difficulty AS difficulty,
+	       t.id AS topic_id, t.nombre AS topic_nombre, score
+	ORDER BY score DESC
+"""
+
+
 def vector_search_exercises(query: str, top_k: int = 10) -> List[Dict[str, Any]]:
 	"""
 	Busca ejercicios por contenido usando vectorización.
 	Returns: [{id, task, difficulty, topic_id, topic_nombre, score}]
 	"""
-	cfg = get_config()
-	q_vec = _embed.embed(query)
-	
-	results: List[Tuple[str, float]] = []
-	
-	use_index = cfg.use_vector_index
-	if use_index is None:
-		use_index = True
-	
-	if use_index:
-		try:
-			cypher = """
-			CALL db.index.vector.queryNodes('exercise_vector', $k, $vec)
-			YIELD node, score
-			RETURN node.id AS id, score
-			"""
-			records = run_query(cypher, {"k": top_k, "vec": q_vec})
-			results = [(r["id"], r["score"]) for r in records]
-		except Neo4jError:
-			results = []
-	
-	if not results:
-		# Fallback: buscar ejercicios con vectores y calcular similitud
-		cypher = """
-		MATCH (e:Exercise)
-		WHERE exists(e.vector) AND e.vector IS NOT NULL
-		RETURN e.id AS id, e.vector AS vec
-		"""
-		records = run_query(cypher, {})
-		candidates: List[Tuple[str, float]] = []
-		for r in records:
-			ex_id = r["id"]
-			vec = r["vec"]
-			sim = _cosine(q_vec, vec)
-			candidates.append((ex_id, sim))
-		candidates.sort(key=lambda x: x[1], reverse=True)
-		results = candidates[:top_k]
-	
-	if not results:
+	if _too_short(query):
 		return []
-	
-	# Obtener información de los ejercicios y sus temas
-	ex_ids = [ex_id for ex_id, _ in results]
-	cypher = """
-	MATCH (e:Exercise)-[:BELONGS_TO]->(t:Topic)
-	WHERE e.id IN $ids
-	RETURN e.id AS id, e.task AS task, e.difficulty AS difficulty, 
-	       t.id AS topic_id, t.nombre AS topic_nombre
-	"""
-	records = run_query(cypher, {"ids": ex_ids})
-	ex_map: Dict[str, Dict[str, Any]] = {}
-	for r in records:
-		ex_map[r["id"]] = {
+	q_vec = embed_query(query)
+	records = _vector_search("exercise_vector", "Exercise", q_vec, top_k, _HYDRATE_EXERCISES)
+	return [
+		{
 			"id": r["id"],
 			"task": r.get("task") or "",
 			"difficulty": float(r.get("difficulty") or 0.0),
 			"topic_id": r.get("topic_id"),
 			"topic_nombre": r.get("topic_nombre") or "",
+			"score": float(r["score"]),
 		}
-	
-	# Adjuntar scores preservando el orden
-	out: List[Dict[str, Any]] = []
-	for ex_id, score in results:
-		if ex_id in ex_map:
-			item = ex_map[ex_id]
-			item["score"] = float(score)
-			out.append(item)
-	
-	return out
+		for r in records
+	]
 
 
 def recommend_exercises(legajo: str, topic_text: str, limit: int = 5) -> Dict[str, Any]:
@@ -444,8 +584,7 @@ def recommend_exercises(legajo: str, topic_text: str, limit: int = 5) -> Dict[st
 	Returns {ok, topic_id, topic_nombre, level, exercises: [{id, task, difficulty}]}
 	"""
 	# Log the search for debugging
-	import sys
-	if sys.stdout.isatty():
+	if _DEBUG:
 		print(f"[DEBUG] recommend_exercises searching for topic: '{topic_text}'", file=sys.stderr)
 	
 	topic = find_topic_by_text(topic_text)
@@ -453,7 +592,7 @@ def recommend_exercises(legajo: str, topic_text: str, limit: int = 5) -> Dict[st
 	
 	# Si no encuentra el tema, buscar ejercicios por contenido
 	if not topic:
-		if sys.stdout.isatty():
+		if _DEBUG:
 			print(f"[DEBUG] Topic not found directly, searching exercises by content...", file=sys.stderr)
 		
 		# Buscar ejercicios relacionados con el término
@@ -488,7 +627,7 @@ def recommend_exercises(legajo: str, topic_text: str, limit: int = 5) -> Dict[st
 					}
 					found_exercises_by_content = best_exercises
 					
-					if sys.stdout.isatty():
+					if _DEBUG:
 						print(f"[DEBUG] Found topic '{topic['nombre']}' via exercise search with {len(best_exercises)} exercises", file=sys.stderr)
 	
 	# Si aún no encuentra tema, devolver error
@@ -505,28 +644,28 @@ def recommend_exercises(legajo: str, topic_text: str, limit: int = 5) -> Dict[st
 		else:
 			error_msg = f"No se encontró un tema relacionado con '{topic_text}' y no hay temas disponibles en la base de datos."
 		
-		if sys.stdout.isatty():
+		if _DEBUG:
 			print(f"[DEBUG] Topic not found. Available topics: {topic_names}", file=sys.stderr)
 		
 		return {"ok": False, "error": error_msg}
 	
 	# Log the found topic for debugging
-	if sys.stdout.isatty():
+	if _DEBUG:
 		print(f"[DEBUG] Topic found: {topic.get('nombre')} (id: {topic.get('id')}, score: {topic.get('score', 0):.3f})", file=sys.stderr)
 	topic_id = topic["id"]
 	topic_nombre = topic.get("nombre") or ""
 
-	# Fetch student level; default to 0.0 if no relation
-	cypher_level = """
-	OPTIONAL MATCH (s:Student {legajo: $legajo})-[r:KNOWS]->(t:Topic {id: $tid})
-	RETURN coalesce(r.level, 0.0) AS level
-	"""
-	records = run_query(cypher_level, {"legajo": legajo, "tid": topic_id})
-	level = float(records[0]["level"]) if records else 0.0
-
 	# Si encontramos ejercicios por contenido, usarlos y filtrarlos por nivel
 	if found_exercises_by_content:
-		if sys.stdout.isatty():
+		# Fetch student level; default to 0.0 if no relation
+		cypher_level = """
+		OPTIONAL MATCH (s:Student {legajo: $legajo})-[r:KNOWS]->(t:Topic {id: $tid})
+		RETURN coalesce(r.level, 0.0) AS level
+		"""
+		records = run_query(cypher_level, {"legajo": legajo, "tid": topic_id})
+		level = float(records[0]["level"]) if records else 0.0
+
+		if _DEBUG:
 			print(f"[DEBUG] Using exercises found by content search, filtering by level {level}", file=sys.stderr)
 		
 		min_level = max(0.0, level - 0.4)
@@ -569,44 +708,27 @@ def recommend_exercises(legajo: str, topic_text: str, limit: int = 5) -> Dict[st
 			"exercises": exercises,
 		}
 
-	# Búsqueda normal por tema
-	min_level = max(0.0, level - 0.4)
-	max_level = min(1.0, level + 0.4)
-
-	if sys.stdout.isatty():
-		print(f"[DEBUG] Will find exercises for topic {topic_id} with level within {min_level} to {max_level} and level {level}", file=sys.stderr)
-    
-	# Primary: within ±0.4
-	cypher_primary = """
-	MATCH (t:Topic {id: $tid})<-[:BELONGS_TO]-(e:Exercise)
-	WITH e, $level AS lvl, toFloat(e.difficulty) AS diff
-	WHERE diff >= $min AND diff <= $max
-	RETURN e.id AS id, e.task AS task, e.answer AS answer, diff AS difficulty
-	ORDER BY abs(diff - lvl) ASC
-	LIMIT toInteger($limit)
-	"""
-	exercises = [
-		dict(r)
-		for r in run_query(
-			cypher_primary,
-			{"tid": topic_id, "min": min_level, "max": max_level, "level": level, "limit": int(limit)},
-		)
-	]
+	# Búsqueda normal por tema: student level, exercises within ±0.4 and the
+	# above-level fallback resolved in a single round trip. bucket 0 = in range,
+	# 1 = above the level; only the best non-empty bucket is returned.
+	cypher_exercises = """
+	OPTIONAL MATCH (:Student {legajo: $legajo})-[r:KNOWS]->(:Topic {id: $tid})
+	WITH coalesce(r.level, 0.0) AS lvl
+	OPTIONAL MATCH (:Topic {id: $tid})<-[:BELONGS_TO]-(e:Exercise)
+	WITH lvl, e, toFloat(e.difficulty) AS diff
+	WITH lvl, e, diff,
+	     CASE WHEN diff >= lvl - 0.4 AND diff <= lvl + 0.4 THEN 0 WHEN diff > lvl THEN 1 ELSE 2 END AS bucket
+	ORDER BY bucket, abs(diff - lvl)
+	WITH lvl, collect(CASE WHEN bucket < 2 THEN {id: e.id, task: e.task, answer: e.answer, difficulty: diff, bucket: bucket} END) AS ranked
+	RETURN lvl AS level,
+	       [x IN ranked WHERE x.bucket = ranked[0].bucket | x {.id, .task, .answer, .difficulty}][..toInteger($limit)] AS exercises
+	"""
+	records = run_query(cypher_exercises, {"legajo": legajo, "tid": topic_id, "limit": int(limit)}, as_dict=True)
+	level = float(records[0]["level"]) if records else 0.0
+	exercises = records[0]["exercises"] if records else []
 
-	# Fallback: strictly above student level
-	if not exercises:
-		cypher_fallback = """
-		MATCH (t:Topic {id: $tid})<-[:BELONGS_TO]-(e:Exercise)
-		WITH e, toFloat(e.difficulty) AS diff
-		WHERE diff > $level
-		RETURN e.id AS id, e.task AS task, e.answer AS answer, diff AS difficulty
-		ORDER BY diff ASC
-		LIMIT toInteger($limit)
-		"""
-		exercises = [
-			dict(r)
-			for r in run_query(cypher_fallback, {"tid": topic_id, "level": level, "limit": int(limit)})
-		]
+	if _DEBUG:
+		print(f"[DEBUG] Found {len(exercises)} exercises for topic {topic_id} around level {level}", file=sys.stderr)
 
 	return {
 		"ok": True,
@@ -616,71 +738,97 @@ def recommend_exercises(legajo: str, topic_text: str, limit: int = 5) -> Dict[st
 		"exercises": exercises,
 	}
 
-def build_summarizer_prompt(query: str, sources: List[Dict[str, Any]]) -> str:
-	parts = [
-		"Eres un asistente docente. Redacta un resumen claro y conciso en español (150–250 palabras).",
-		"Usa exclusivamente la información de las fuentes proporcionadas; no inventes datos.",
-		"Incluye: breve definición/contexto, puntos clave, y 1–2 ejemplos si están presentes.",
-		"Cita los títulos de las fuentes entre paréntesis cuando corresponda.",
-		"",
-		f"Tema de la solicitud: {query}",
-		"",
-		"Fuentes:",
-	]
-	for i, s in enumerate(sources, start=1):
-		title = s.get("title") or (s["type"].title() + " " + s["id"])
-		content = s.get("content") or ""
-		parts.append(f"[{i}] {title}\n{content}")
-	parts.append("")
-	parts.append("Escribe el resumen ahora, en un bloque coherente.")
-	return "\n".join(parts)
-
-def build_validator_prompt(query: str, sources: List[Dict[str, Any]], draft: str) -> str:
-	parts = [
-		"Eres un verificador estricto. Evalúa si el resumen es relevante, fiel a las fuentes y claro.",
-		"Responde SOLO en JSON con el formato: {\"valid\": true|false, \"feedback\": \"...\"}",
-		"Evalúa: relevancia al tema, fundamentación en fuentes, coherencia/claridad, longitud (150–250 palabras).",
-		"",
-		f"Tema: {query}",
-		"",
-		"Fuentes (para verificación):",
-	]
-	for i, s in enumerate(sources, start=1):
-		title = s.get("title") or (s["type"].title() + " " + s["id"])
-		content = s.get("content") or ""
-		parts.append(f"[{i}] {title}\n{content}")
-	parts += ["", "Resumen propuesto:", draft, "", "JSON:"]
-	return "\n".join(parts)
-
-def build_regenerator_prompt(query: str, sources: List[Dict[str, Any]], draft: str, feedback: str) -> str:
-	parts = [
-		"Eres un asistente docente. Regenera el resumen corrigiendo los problemas señalados.",
-		"Usa SOLO la información de las fuentes, manteniendo 150–250 palabras y claridad.",
-		"Incluye citas breves con los títulos entre paréntesis cuando apoyen afirmaciones específicas.",
-		"",
-		f"Tema: {query}",
-		"",
-		"Feedback del validador:",
-		feedback,
-		"",
-		"Fuentes:",
-	]
-	for i, s in enumerate(sources, start=1):
-		title = s.get("title") or (s["type"].title() + " " + s["id"])
-		content = s.get("content") or ""
-		parts.append(f"[{i}] {title}\n{content}")
-	parts += ["", "Borrador original:", draft, "", "Regenera el resumen:"]
-	return "\n".join(parts)
+def render_sources(sources: List[Dict[str, Any]]) -> str:
+	"""
+	Renders sources as numbered "[i] title\ncontent" blocks, as used by the summary prompts.
+	"""
+	return "\n".join(
+		f"[{i}] {s.get('title') or (s['type'].title() + ' ' + s['id'])}\n{s.get('content') or ''}"
+		for i, s in enumerate(sources, start=1)
+	)
+
+
+# Summary prompt templates (str.format, bound once); {sources} is the render_sources block
+_format_summarizer_prompt = (
+	"Eres un asistente docente. Redacta un resumen claro y conciso en español (150–250 palabras).\n"
+	"Usa exclusivamente la información de las fuentes proporcionadas; no inventes datos.\n"
+	"Incluye: breve definición/contexto, puntos clave, y 1–2 ejemplos si están presentes.\n"
+	"Cita los títulos de las fuentes entre paréntesis cuando corresponda.\n"
+	"\n"
+	"Tema de la solicitud: {query}\n"
+	"\n"
+	"Fuentes:\n"
+	"{sources}\n"
+	"\n"
+	"Escribe el resumen ahora, en un bloque coherente."
+).format
+_format_validator_prompt = (
+	"Eres un verificador estricto. Evalúa si el resumen es relevante, fiel a las fuentes y claro.\n"
+	"Responde SOLO en JSON con el formato: {{\"valid\": true|false, \"feedback\": \"...\"}}\n"
+	"Evalúa: relevancia al tema, fundamentación en fuentes, coherencia/claridad, longitud (150–250 palabras).\n"
+	"\n"
+	"Tema: {query}\n"
+	"\n"
+	"Fuentes (para verificación):\n"
+	"{sources}\n"
+	"\n"
+	"Resumen propuesto:\n"
+	"{draft}\n"
+	"\n"
+	"JSON:"
+).format
+_format_regenerator_prompt = (
+	"Eres un asistente docente. Regenera el resumen corrigiendo los problemas señalados.\n"
+	"Usa SOLO la información de las fuentes, manteniendo 150–250 palabras y claridad.\n"
+	"Incluye citas breves con los títulos entre paréntesis cuando apoyen afirmaciones específicas.\n"
+	"\n"
+	"Tema: {query}\n"
+	"\n"
+	"Feedback del validador:\n"
+	"{feedback}\n"
+	"\n"
+	"Fuentes:\n"
+	"{sources}\n"
+	"\n"
+	"Borrador original:\n"
+	"{draft}\n"
+	"\n"
+	"Regenera el resumen:"
+).format
+
+
+def build_summarizer_prompt(query: str, sources: List[Dict[str, Any]], sources_block: Optional[str] = None) -> str:
+	return _format_summarizer_prompt(
+		query=query,
+		sources=sources_block if sources_block is not None else render_sources(sources),
+	)
+
+def build_validator_prompt(query: str, sources: List[Dict[str, Any]], draft: str, sources_block: Optional[str] = None) -> str:
+	return _format_validator_prompt(
+		query=query,
+		sources=sources_block if sources_block is not None else render_sources(sources),
+		draft=draft,
+	)
+
+def build_regenerator_prompt(query: str, sources: List[Dict[str, Any]], draft: str, feedback: str, sources_block: Optional[str] = None) -> str:
+	return _format_regenerator_prompt(
+		query=query,
+		feedback=feedback,
+		sources=sources_block if sources_block is not None else render_sources(sources),
+		draft=draft,
+	)
 
 def summarize_with_validation(llm, query: str, max_sources: int = 5) -> str:
 	sources = gather_sources_for_summary(query, max_sources=max_sources)
 	if not sources:
 		return "No encontré material suficiente para un resumen."
+	# The same sources block is shared by the draft, validation and regeneration prompts
+	sources_block = render_sources(sources)
 	# Draft
-	p_sum = build_summarizer_prompt(query, sources)
+	p_sum = build_summarizer_prompt(query, sources, sources_block)
 	draft = llm.invoke(p_sum)
 	# Validate
-	p_val = build_validator_prompt(query, sources, draft)
+	p_val = build_validator_prompt(query, sources, draft, sources_block)
 	review = llm.invoke(p_val)
 	valid = True
 	feedback = ""
@@ -694,13 +842,12 @@ def summarize_with_validation(llm, query: str, max_sources: int = 5) -> str:
 	except Exception:
 		# If parsing fails, assume valid and return first draft
 		valid = True
+	sources_str = ", ".join([s.get("title") or s["id"] for s in sources])
 	if valid:
-		sources_str = ", ".join([s.get("title") or s["id"] for s in sources])
 		return f"{draft}\n\nFuentes: {sources_str}"
 	# Regenerate
-	p_reg = build_regenerator_prompt(query, sources, draft, feedback or "Mejora claridad y grounding.")
+	p_reg = build_regenerator_prompt(query, sources, draft, feedback or "Mejora claridad y grounding.", sources_block)
 	draft2 = llm.invoke(p_reg)
-	sources_str = ", ".join([s.get("title") or s["id"] for s in sources])
 	return f"{draft2}\n\nFuentes: {sources_str}\nNota: este resumen se regeneró tras una verificación adicional; podría contener imprecisiones."
 
 
@@ -722,33 +869,81 @@ def get_topic_summaries(legajo: str, topic_term: Optional[str] = None) -> List[D
 	       toString(coalesce(max(ss.startedAt), datetime())) AS last_activity
 	ORDER BY sessions DESC, answers DESC
 	"""
-	records = run_query(cypher, {"legajo": legajo, "term": topic_term})
-	return [dict(r) for r in records]
+	return run_query(cypher, {"legajo": legajo, "term": topic_term}, as_dict=True)
 
 def grade_answer(legajo: str, exercise_id: str, user_answer: str) -> Dict[str, Any]:
 	"""
 	Grades an answer via embedding similarity to the stored gold answer.
 	Creates Answer node and relation, updates knowledge level.
 	"""
-	# Fetch exercise, its topic, and gold answer
+	return grade_answers(legajo, [(exercise_id, user_answer)])[0]
+
+
+def _row_cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+	"""
+	Row-wise cosine similarity of two (B, D) matrices; zero rows yield 0.0.
+	"""
+	dots = np.einsum("bd,bd->b", a, b)
+	norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+	return np.divide(dots, norms, out=np.zeros_like(dots), where=norms != 0)
+
+
+def grade_answers(legajo: str, items: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+	"""
+	Batched grade_answer for [(exercise_id, user_answer), ...]; results keep the input order.
+	Student answers are embedded in one request; gold answers reuse the vector stored on the
+	exercise (e.answer_vector), embedding concurrently only those that are missing or stale.
+	e.answer_hash (cache_key of model + gold answer) marks a stored vector as current, so
+	changing the answer text or the embedding model re-embeds it.
+	"""
+	if not items:
+		return []
+	# Fetch exercises, their topic, gold answers and the gold vector stored on first grading
 	cypher = """
-	MATCH (e:Exercise {id: $eid})-[:BELONGS_TO]->(t:Topic)
-	RETURN e.id AS id, e.answer AS gold, t.id AS topic_id
+	MATCH (e:Exercise)-[:BELONGS_TO]->(t:Topic)
+	WHERE e.id IN $eids
+	RETURN e.id AS id, e.answer AS gold, e.answer_vector AS gvec, e.answer_hash AS ghash, t.id AS topic_id
 	"""
-	records = run_query(cypher, {"eid": exercise_id})
-	rec = records[0] if records else None
-	if not rec:
-		return {"ok": False, "error": "Exercise not found"}
-	gold = rec["gold"] or ""
-	topic_id = rec["topic_id"]
+	records = run_query(cypher, {"eids": list({eid for eid, _ in items})})
+	exercises = {r["id"]: r for r in records}
 
-	u_vec = _embed.embed(user_answer)
-	g_vec = _embed.embed(gold) if gold else []
+	# Only non-blank answers to exercises with a gold answer need embeddings; the rest score 0.0
+	scored = [
+		i for i, (eid, answer) in enumerate(items)
+		if eid in exercises and exercises[eid]["gold"] and answer and answer.strip()
+	]
+	confidences = [0.0] * len(items)
+	if scored:
+		model = _get_embed().model
+		gold_vecs = {eid: exercises[eid]["gvec"] for eid in {items[i][0] for i in scored}}
+		gold_hashes = {eid: cache_key(model, exercises[eid]["gold"]) for eid in gold_vecs}
+		missing = [eid for eid, vec in gold_vecs.items() if not vec or exercises[eid]["ghash"] != gold_hashes[eid]]
+		# Missing gold vectors embed on the pool while the student answers embed here
+		g_future = _search_pool.submit(embed_queries, [exercises[eid]["gold"] for eid in missing]) if missing else None
+		u_mat = np.asarray(_get_embed().embed_batch([items[i][1] for i in scored]), dtype=np.float64)
+		if g_future is not None:
+			new_vecs = g_future.result()
+			gold_vecs.update(zip(missing, new_vecs))
+			# Write-behind: later submissions read the gold vector with the exercise
+			run_write(
+				"UNWIND $rows AS row MATCH (e:Exercise {id: row.id}) SET e.answer_vector = row.vec, e.answer_hash = row.hash",
+				{"rows": [{"id": eid, "vec": vec, "hash": gold_hashes[eid]} for eid, vec in zip(missing, new_vecs)]},
+			)
+		g_mat = np.asarray([gold_vecs[items[i][0]] for i in scored], dtype=np.float64)
+		for i, sim in zip(scored, np.clip(_row_cosines(u_mat, g_mat), 0.0, 1.0)):
+			confidences[i] = float(sim)
+
+	results: List[Dict[str, Any]] = []
+	for (exercise_id, user_answer), confidence in zip(items, confidences):
+		rec = exercises.get(exercise_id)
+		if not rec:
+			results.append({"ok": False, "error": "Exercise not found"})
+			continue
+		results.append(_store_graded_answer(legajo, exercise_id, rec["topic_id"], user_answer, confidence))
+	return results
 
-	confidence = 0.0
-	if g_vec:
-		confidence = max(0.0, min(1.0, _cosine(u_vec, g_vec)))
 
+def _store_graded_answer(legajo: str, exercise_id: str, topic_id: str, user_answer: str, confidence: float) -> Dict[str, Any]:
 	# Store Answer
 	cypher_create = """
 	MERGE (s:Student {legajo: $legajo})
@@ -762,19 +957,20 @@ def grade_answer(legajo: str, exercise_id: str, user_answer: str) -> Dict[str, A
 	CREATE (ss)-[:HAS_ANSWER]->(a)
 	RETURN a.id AS id
 	"""
-	run_query(
-		cypher_create,
-		{
-			"legajo": legajo,
-			"eid": exercise_id,
-			"content": user_answer,
-			"confidence": float(confidence),
-			"sid": f"{date.today().isoformat()}-{legajo}",
-		},
-	)
+	params = {
+		"legajo": legajo,
+		"eid": exercise_id,
+		"content": user_answer,
+		"confidence": float(confidence),
+		"sid": f"{date.today().isoformat()}-{legajo}",
+	}
 
-	# Update knowledge level in background (synchronous call here)
-	new_level = update_student_topic_level(legajo, topic_id, float(confidence))
+	# Store the answer and update the knowledge level in one transaction
+	_, level_records = run_query_batch([
+		(cypher_create, params),
+		update_level_query(legajo, topic_id, float(confidence)),
+	])
+	new_level = level_records[0]["level"] if level_records else None
 
 	return {"ok": True, "confidence": float(confidence), "new_level": new_level, "topic_id": topic_id}
 
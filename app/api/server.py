@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import asyncio
 import sys
-from typing import Dict, Optional
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional, Tuple
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
@@ -15,12 +17,18 @@ if project_root not in sys.path:
 	sys.path.insert(0, project_root)
 
 from app.config import get_config
-from app.agent.agent import initialize_agent, build_llm, upsert_student, ensure_vector_indexes
-from langchain_ollama import OllamaLLM
+from app.agent.agent import initialize_agent, build_llm, build_router_llm, upsert_student, ensure_vector_indexes
 
-# Store agent instances per legajo (in production, use Redis or similar)
-agent_instances: Dict[str, callable] = {}
+if TYPE_CHECKING:
+	# Only for annotations; build_llm() imports LangChain when the server starts
+	from langchain_ollama import OllamaLLM
+
+# Store agent instances per legajo (in production, use Redis or similar).
+# LRU bounded by MAX_AGENT_SESSIONS; an evicted student starts a new conversation on the next message.
+# Each agent has its own lock so a student's messages are processed one at a time.
+agent_instances: "OrderedDict[str, Tuple[callable, asyncio.Lock]]" = OrderedDict()
 llm_instance: Optional[OllamaLLM] = None
+router_llm_instance: Optional[OllamaLLM] = None
 
 
 @asynccontextmanager
@@ -36,8 +44,9 @@ async def lifespan(app: FastAPI):
 		ensure_vector_indexes()
 		
 		print("Building LLM...")
-		global llm_instance
+		global llm_instance, router_llm_instance
 		llm_instance = build_llm()
+		router_llm_instance = build_router_llm()
 		
 		# Test LLM connection
 		print("Testing LLM connection...")
@@ -91,18 +100,27 @@ async def chat(message: ChatMessage):
 		raise HTTPException(status_code=400, detail="Legajo and message are required")
 	
 	try:
-		# Ensure student exists
-		upsert_student(message.legajo)
-		
 		# Get or create agent instance for this legajo
 		if message.legajo not in agent_instances:
 			if llm_instance is None:
 				raise HTTPException(status_code=500, detail="LLM not initialized")
-			agent_instances[message.legajo] = initialize_agent(message.legajo, llm_instance)
+			agent_instances[message.legajo] = (
+				initialize_agent(message.legajo, llm_instance, router_llm_instance),
+				asyncio.Lock(),
+			)
+			max_sessions = get_config().max_agent_sessions
+			while len(agent_instances) > max_sessions:
+				agent_instances.popitem(last=False)
+		else:
+			agent_instances.move_to_end(message.legajo)
 		
-		# Process message
-		handle_query = agent_instances[message.legajo]
-		response_text = handle_query(message.message)
+		# Process message. Neo4j, Ollama and the LLM calls are blocking, so they run in a
+		# worker thread and the event loop keeps serving other students meanwhile.
+		handle_query, lock = agent_instances[message.legajo]
+		async with lock:
+			# Ensure student exists
+			await asyncio.to_thread(upsert_student, message.legajo)
+			response_text = await asyncio.to_thread(handle_query, message.message)
 		
 		# Ensure response_text is a string
 		if response_text is None:
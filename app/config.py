@@ -1,5 +1,6 @@
 import os
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional
 
 from dotenv import load_dotenv
@@ -13,9 +14,23 @@ class AppConfig:
 	neo4j_uri: str
 	neo4j_user: str
 	neo4j_password: str
+	neo4j_database: str = ""
+	neo4j_max_pool_size: int = 50
+	neo4j_acquisition_timeout: float = 30.0
 	ollama_base_url: str = "http://localhost:11434"
 	ollama_model: str = "qwen2.5:7b-instruct"
+	router_model: str = ""
 	use_vector_index: Optional[bool] = None
+	semantic_cache_enabled: bool = True
+	semantic_cache_threshold: float = 0.93
+	semantic_cache_size: int = 256
+	semantic_cache_ttl: float = 3600.0
+	embedding_cache_size: int = 1024
+	embedding_cache_path: str = ""
+	speculative_retrieval: bool = False
+	agent_debug: bool = False
+	max_agent_sessions: int = 1024
+	min_query_chars: int = 2
 
 
 def _parse_bool(value: Optional[str]) -> Optional[bool]:
@@ -29,14 +44,32 @@ def _parse_bool(value: Optional[str]) -> Optional[bool]:
 	return None
 
 
+@lru_cache(maxsize=1)
 def get_config() -> AppConfig:
+	"""
+	Settings are read from the environment (and .env) once per process; AppConfig is frozen, so the instance is shared.
+	"""
 	return AppConfig(
 		neo4j_uri=os.getenv("NEO4J_URI", ""),
 		neo4j_user=os.getenv("NEO4J_USER", ""),
 		neo4j_password=os.getenv("NEO4J_PASSWORD", ""),
+		neo4j_database=os.getenv("NEO4J_DATABASE", ""),
+		neo4j_max_pool_size=int(os.getenv("NEO4J_MAX_POOL_SIZE", "50")),
+		neo4j_acquisition_timeout=float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "30")),
 		ollama_base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
 		ollama_model=os.getenv("OLLAMA_MODEL", "qwen2.5:0.5b"),
+		router_model=os.getenv("ROUTER_MODEL", ""),
 		use_vector_index=_parse_bool(os.getenv("USE_VECTOR_INDEX")),
+		semantic_cache_enabled=_parse_bool(os.getenv("SEMANTIC_CACHE_ENABLED")) is not False,
+		semantic_cache_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.93")),
+		semantic_cache_size=int(os.getenv("SEMANTIC_CACHE_SIZE", "256")),
+		semantic_cache_ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "3600")),
+		embedding_cache_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "1024")),
+		embedding_cache_path=os.getenv("EMBEDDING_CACHE_PATH", ""),
+		speculative_retrieval=_parse_bool(os.getenv("SPECULATIVE_RETRIEVAL")) is True,
+		agent_debug=_parse_bool(os.getenv("AGENT_DEBUG")) is True,
+		max_agent_sessions=int(os.getenv("MAX_AGENT_SESSIONS", "1024")),
+		min_query_chars=int(os.getenv("MIN_QUERY_CHARS", "2")),
 	)
 
 
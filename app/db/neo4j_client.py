@@ -1,42 +1,211 @@
 from __future__ import annotations
 
+import os
+import re
 from contextlib import contextmanager
-from typing import Any, Dict, Iterable, Optional
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-from neo4j import GraphDatabase, Driver, Session
+from neo4j import READ_ACCESS, WRITE_ACCESS, GraphDatabase, Driver, Result, ResultSummary, RoutingControl, Session
+from neo4j.exceptions import ClientError
 
 from app.config import get_config
 
 
 _driver: Optional[Driver] = None
+_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.cypher")
+_CONSTRAINT_NAME_RE = re.compile(r"CREATE\s+CONSTRAINT\s+(\w+)", re.IGNORECASE)
 
 
 def get_driver() -> Driver:
+	"""
+	Process-wide driver. Sessions borrow connections from its pool, so a session per query is cheap.
+	"""
 	global _driver
 	if _driver is None:
 		cfg = get_config()
 		_driver = GraphDatabase.driver(
 			cfg.neo4j_uri,
 			auth=(cfg.neo4j_user, cfg.neo4j_password),
+			max_connection_pool_size=cfg.neo4j_max_pool_size,
+			connection_acquisition_timeout=cfg.neo4j_acquisition_timeout,
 		)
 	return _driver
 
 
+def _database() -> Optional[str]:
+	"""
+	Target database (NEO4J_DATABASE); naming it skips the home-database lookup on every session.
+	"""
+	return get_config().neo4j_database or None
+
+
 @contextmanager
-def get_session(database: Optional[str] = None) -> Iterable[Session]:
+def get_session(database: Optional[str] = None, write: bool = True, fetch_size: Optional[int] = None) -> Iterable[Session]:
 	driver = get_driver()
-	session = driver.session(database=database) if database else driver.session()
+	options: Dict[str, Any] = {"fetch_size": fetch_size} if fetch_size else {}
+	session = driver.session(
+		database=database or _database(),
+		default_access_mode=WRITE_ACCESS if write else READ_ACCESS,
+		**options,
+	)
 	try:
 		yield session
 	finally:
 		session.close()
 
 
-def run_query(cypher: str, parameters: Optional[Dict[str, Any]] = None) -> Any:
+def run_query(cypher: str, parameters: Optional[Dict[str, Any]] = None, as_dict: bool = False, write: bool = True) -> Any:
+	"""
+	Runs one statement through the driver's execute_query (pooled session, managed transaction with retries).
+	Returns the list of records, or plain dicts (Result.data) when as_dict is set.
+	write=False routes the statement to a reader (read replica / follower in a cluster).
+	Pass values through parameters, never formatted into the text: the server caches plans
+	by query text, so a stable text is parsed and planned only once.
+	"""
+	routing = RoutingControl.WRITE if write else RoutingControl.READ
+	if as_dict:
+		return get_driver().execute_query(
+			cypher, parameters or {}, database_=_database(), routing_=routing, result_transformer_=Result.data,
+		)
+	return get_driver().execute_query(cypher, parameters or {}, database_=_database(), routing_=routing).records
+
+
+def run_write(cypher: str, parameters: Optional[Dict[str, Any]] = None) -> ResultSummary:
+	"""
+	Runs one write statement whose records are not needed (no RETURN) via execute_query,
+	consuming the result: only the summary (counters) is returned, no records are buffered.
+	"""
+	return get_driver().execute_query(
+		cypher, parameters or {}, database_=_database(), routing_=RoutingControl.WRITE, result_transformer_=Result.consume,
+	)
+
+
+def stream_query(
+	cypher: str,
+	parameters: Optional[Dict[str, Any]] = None,
+	write: bool = True,
+	fetch_size: Optional[int] = None,
+) -> Iterator[Any]:
+	"""
+	Yields records as they arrive from the server instead of materializing the result.
+	The session stays open until the generator is exhausted or closed.
+	fetch_size sets how many records the driver requests per batch (driver default: 1000).
+	"""
+	with get_session(write=write, fetch_size=fetch_size) as session:
+		yield from session.run(cypher, parameters or {})
+
+
+def run_autocommit_query(cypher: str, parameters: Optional[Dict[str, Any]] = None) -> List[Any]:
+	"""
+	Runs one statement in an auto-commit transaction (session.run), as required by
+	CALL { ... } IN TRANSACTIONS batching. Returns the list of records.
+	"""
+	with get_session() as session:
+		return list(session.run(cypher, parameters or {}))
+
+
+def detach_delete_in_batches(
+	match_cypher: str,
+	parameters: Optional[Dict[str, Any]] = None,
+	batch_size: int = 10000,
+) -> None:
+	"""
+	DETACH DELETEs the nodes bound to n by match_cypher (a MATCH ... WHERE ... without RETURN),
+	committing every batch_size nodes instead of holding them all in one transaction.
+	Uses CALL { ... } IN TRANSACTIONS; servers without it (Neo4j < 4.4) fall back to apoc.periodic.iterate.
+	"""
+	try:
+		run_autocommit_query(
+			f"{match_cypher}\nCALL {{ WITH n DETACH DELETE n }} IN TRANSACTIONS OF {int(batch_size)} ROWS",
+			parameters,
+		)
+	except ClientError as e:
+		if e.code != "Neo.ClientError.Statement.SyntaxError":
+			raise
+		run_query(
+			"CALL apoc.periodic.iterate($match, 'DETACH DELETE n', {batchSize: $batch_size, parallel: false, params: $params})",
+			{"match": f"{match_cypher}\nRETURN n", "batch_size": int(batch_size), "params": parameters or {}},
+		)
+
+
+def unwind_in_transactions(
+	row_cypher: str,
+	rows: Sequence[Dict[str, Any]],
+	batch_size: int = 500,
+) -> None:
+	"""
+	Runs row_cypher (a write clause using row) for every element of rows in one request,
+	letting the server commit every batch_size rows with CALL { ... } IN TRANSACTIONS.
+	Servers without it (Neo4j < 4.4) get one UNWIND statement per batch instead.
+	"""
+	if not rows:
+		return
+	try:
+		run_autocommit_query(
+			f"UNWIND $rows AS row\nCALL {{ WITH row {row_cypher} }} IN TRANSACTIONS OF {int(batch_size)} ROWS",
+			{"rows": list(rows)},
+		)
+	except ClientError as e:
+		if e.code != "Neo.ClientError.Statement.SyntaxError":
+			raise
+		for i in range(0, len(rows), batch_size):
+			run_write(f"UNWIND $rows AS row\n{row_cypher}", {"rows": list(rows[i:i + batch_size])})
+
+
+def run_query_batch(queries: Sequence[Tuple[str, Optional[Dict[str, Any]]]], write: bool = True) -> List[Any]:
+	"""
+	Runs several statements in order inside a single managed transaction (one session, one commit).
+	Returns the materialized records of each statement, in the same order.
+	"""
+	def _work(tx) -> List[Any]:
+		return [list(tx.run(cypher, parameters or {})) for cypher, parameters in queries]
+
+	with get_session() as session:
+		if write:
+			return session.execute_write(_work)
+		return session.execute_read(_work)
+
+
+@lru_cache(maxsize=None)
+def schema_statements(path: str = _SCHEMA_PATH) -> Tuple[str, ...]:
+	"""
+	Reads the statements of schema.cypher, dropping // comments and empty statements.
+	Parsed once per path.
+	"""
+	with open(path, "r", encoding="utf-8") as f:
+		cypher = f.read()
+	statements = []
+	for s in cypher.split(";"):
+		lines = []
+		for line in s.split("\n"):
+			if "//" in line:
+				line = line[:line.index("//")]
+			line = line.strip()
+			if line:
+				lines.append(line)
+		if lines:
+			statements.append("\n".join(lines))
+	return tuple(statements)
+
+
+def apply_schema() -> None:
+	"""
+	Creates the uniqueness constraints (and their backing indexes) of schema.cypher; idempotent.
+	All statements run on one session, each in its own auto-commit transaction
+	(schema changes cannot share a transaction with other writes).
+	Constraints whose name already exists (SHOW CONSTRAINTS) are skipped.
+	"""
 	with get_session() as session:
-		result = session.run(cypher, parameters or {})
-		# Materialize results before closing the session to avoid ResultConsumedError
-		return list(result)
+		try:
+			existing = {r["name"] for r in session.run("SHOW CONSTRAINTS YIELD name")}
+		except ClientError:
+			existing = set()
+		for stmt in schema_statements():
+			match = _CONSTRAINT_NAME_RE.match(stmt)
+			if match and match.group(1) in existing:
+				continue
+			session.run(stmt).consume()
 
 
 def close_driver() -> None:
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+
+def normalize_text(text: str) -> str:
+	return " ".join((text or "").split())
+
+
+def cache_key(model: str, text: str) -> str:
+	return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+	"""
+	SHA-256 keyed LRU cache of embeddings.
+	If db_path is given, entries are also persisted to sqlite and survive process restarts.
+	Persisted vectors are stored as packed float32 blobs.
+	"""
+
+	def __init__(self, max_size: int = 1024, db_path: Optional[str] = None) -> None:
+		self.max_size = max_size
+		self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+		self._lock = threading.Lock()
+		self._db: Optional[sqlite3.Connection] = None
+		if db_path:
+			self._db = sqlite3.connect(db_path, check_same_thread=False)
+			self._db.execute("CREATE TABLE IF NOT EXISTS embedding_blobs (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+			self._db.commit()
+
+	def get(self, key: str) -> Optional[List[float]]:
+		with self._lock:
+			vec = self._entries.get(key)
+			if vec is not None:
+				self._entries.move_to_end(key)
+				return vec
+			if self._db is None:
+				return None
+			row = self._db.execute("SELECT vector FROM embedding_blobs WHERE key = ?", (key,)).fetchone()
+			if row is None:
+				return None
+			vec = array("f", row[0]).tolist()
+			self._remember(key, vec)
+			return vec
+
+	def put(self, key: str, vec: List[float]) -> None:
+		with self._lock:
+			self._remember(key, vec)
+			if self._db is not None:
+				self._db.execute(
+					"INSERT OR REPLACE INTO embedding_blobs (key, vector) VALUES (?, ?)",
+					(key, array("f", vec).tobytes()),
+				)
+				self._db.commit()
+
+	def _remember(self, key: str, vec: List[float]) -> None:
+		self._entries[key] = vec
+		self._entries.move_to_end(key)
+		while len(self._entries) > self.max_size:
+			self._entries.popitem(last=False)
+
+	def __len__(self) -> int:
+		return len(self._entries)
@@ -1,37 +1,124 @@
 from __future__ import annotations
 
 import json
-from typing import List, Sequence
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Sequence
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from app.config import get_config
 
 
 EMBEDDING_MODEL = "mxbai-embed-large"
 
+# Embedding dimension per "model@base_url", persisted so later startups skip the probe request
+_DIMENSIONS_PATH = os.path.join(os.path.expanduser("~"), ".cache", "agente", "embed_dims.json")
+_dimensions: Dict[str, int] = {}
+
+
+def _load_dimensions() -> None:
+	try:
+		with open(_DIMENSIONS_PATH, "r", encoding="utf-8") as f:
+			_dimensions.update({k: int(v) for k, v in json.load(f).items()})
+	except (OSError, ValueError, AttributeError):
+		pass
+
+
+def _save_dimensions() -> None:
+	try:
+		os.makedirs(os.path.dirname(_DIMENSIONS_PATH), exist_ok=True)
+		with open(_DIMENSIONS_PATH, "w", encoding="utf-8") as f:
+			json.dump(_dimensions, f)
+	except OSError:
+		pass
+
+
+def l2_normalize(vec: List[float]) -> List[float]:
+	norm = math.hypot(*vec)
+	if norm == 0:
+		return list(vec)
+	return [x / norm for x in vec]
+
 
 class OllamaEmbeddingClient:
-	def __init__(self, base_url: str | None = None, model: str = EMBEDDING_MODEL) -> None:
+	"""
+	Embeddings are returned L2-normalized by default, so stored vectors can be compared with a plain dot product.
+	"""
+
+	def __init__(self, base_url: str | None = None, model: str = EMBEDDING_MODEL, normalize: bool = True) -> None:
 		cfg = get_config()
 		self.base_url = base_url or cfg.ollama_base_url
 		self.model = model
+		self.normalize = normalize
 		self._endpoint = f"{self.base_url.rstrip('/')}/api/embeddings"
+		self._batch_endpoint = f"{self.base_url.rstrip('/')}/api/embed"
+		# Keep-alive connections shared by every call (the agent embeds from several threads)
+		self._session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+		self._session.mount("http://", adapter)
+		self._session.mount("https://", adapter)
+
+	def close(self) -> None:
+		self._session.close()
+
+	def __enter__(self) -> "OllamaEmbeddingClient":
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		self.close()
 
 	def embed(self, text: str) -> List[float]:
 		payload = {"model": self.model, "prompt": text}
-		resp = requests.post(self._endpoint, data=json.dumps(payload), timeout=60)
+		resp = self._session.post(self._endpoint, json=payload, timeout=(5, 60))
 		resp.raise_for_status()
 		data = resp.json()
 		# API returns: {"embedding": [..]}
-		return data["embedding"]
+		vec = data["embedding"]
+		return l2_normalize(vec) if self.normalize else vec
+
+	def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+		"""
+		Embeds several texts in a single request via /api/embed.
+		"""
+		if not texts:
+			return []
+		payload = {"model": self.model, "input": list(texts)}
+		resp = self._session.post(self._batch_endpoint, json=payload, timeout=(5, 120))
+		resp.raise_for_status()
+		data = resp.json()
+		# API returns: {"embeddings": [[..], ..]}
+		vecs = data["embeddings"]
+		return [l2_normalize(v) for v in vecs] if self.normalize else vecs
+
+	def embed_batches(self, texts: Sequence[str], batch_size: int = 32, workers: int = 4) -> Iterator[List[List[float]]]:
+		"""
+		Embeds texts in batch_size requests, up to workers of them in flight at once
+		(Ollama serves them in parallel up to OLLAMA_NUM_PARALLEL).
+		Yields each batch's vectors in input order as soon as it and the batches before it are done.
+		"""
+		batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+		if len(batches) <= 1 or workers <= 1:
+			yield from map(self.embed_batch, batches)
+			return
+		with ThreadPoolExecutor(max_workers=min(workers, len(batches)), thread_name_prefix="embed") as pool:
+			yield from pool.map(self.embed_batch, batches)
 
-	def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
-		# Ollama API embeds one text per call; batch on client side
-		return [self.embed(t) for t in texts]
+	def embed_many(self, texts: Sequence[str], batch_size: int = 32, workers: int = 4) -> List[List[float]]:
+		return [vec for batch in self.embed_batches(texts, batch_size, workers) for vec in batch]
 
 	def detect_dimension(self) -> int:
-		vec = self.embed("dimension probe")
-		return len(vec)
+		"""
+		Embedding size of this model. Probed once per model and server, then read from the on-disk cache.
+		"""
+		key = f"{self.model}@{self.base_url}"
+		if not _dimensions:
+			_load_dimensions()
+		if key not in _dimensions:
+			_dimensions[key] = len(self.embed("dimension probe"))
+			_save_dimensions()
+		return _dimensions[key]
 
 
@@ -14,34 +14,45 @@ if _ROOT not in sys.path:
 	sys.path.insert(0, _ROOT)
 
 from app.config import get_config
-from app.db.neo4j_client import run_query
+from app.db.neo4j_client import apply_schema, detach_delete_in_batches, run_query
 
 
 def clean_all_exercises() -> None:
 	"""Elimina todos los ejercicios y sus respuestas."""
 	print("Eliminando todos los ejercicios...")
-	run_query(
+	# Toda Answer responde a un Exercise (grade_answer siempre crea ANSWERS)
+	detach_delete_in_batches(
 		"""
-		MATCH (e:Exercise)
-		OPTIONAL MATCH (a:Answer)-[:ANSWERS]->(e)
-		DETACH DELETE e, a
+		MATCH (n)
+		WHERE n:Answer OR n:Exercise
 		"""
 	)
 	print("✅ Ejercicios eliminados")
 
 
+# Documents, their sections, exercises and their answers of the topic bound to t.
+# One UNION branch per kind instead of chained OPTIONAL MATCHes, so rows do not multiply.
+_TOPIC_CONTENT_NODES = """
+CALL {
+	WITH t MATCH (t)<-[:BELONGS_TO]-(n:Document) RETURN n
+	UNION
+	WITH t MATCH (t)<-[:BELONGS_TO]-(:Document)-[:HAS_SECTION]->(n:Section) RETURN n
+	UNION
+	WITH t MATCH (t)<-[:BELONGS_TO]-(n:Exercise) RETURN n
+	UNION
+	WITH t MATCH (t)<-[:BELONGS_TO]-(:Exercise)<-[:ANSWERS]-(n:Answer) RETURN n
+}
+WITH DISTINCT n
+"""
+
+
 def clean_topic_data(topic_id: str) -> None:
 	"""Elimina todos los datos de un tema específico."""
 	print(f"Eliminando datos del tema {topic_id}...")
-	run_query(
-		"""
-		MATCH (t:Topic {id: $topic_id})
-		OPTIONAL MATCH (d:Document)-[:BELONGS_TO]->(t)
-		OPTIONAL MATCH (s:Section)<-[:HAS_SECTION]-(d)
-		OPTIONAL MATCH (e:Exercise)-[:BELONGS_TO]->(t)
-		OPTIONAL MATCH (a:Answer)-[:ANSWERS]->(e)
-		DETACH DELETE d, s, e, a
-		"""
+	detach_delete_in_batches(
+		"MATCH (t:Topic {id: $topic_id})\n" + _TOPIC_CONTENT_NODES,
+		{"topic_id": topic_id},
+		batch_size=5000,
 	)
 	print(f"✅ Datos del tema {topic_id} eliminados")
 
@@ -49,16 +60,9 @@ def clean_topic_data(topic_id: str) -> None:
 def clean_all_topics() -> None:
 	"""Elimina todos los temas y sus datos relacionados."""
 	print("Eliminando todos los temas...")
-	run_query(
-		"""
-		MATCH (t:Topic)
-		OPTIONAL MATCH (d:Document)-[:BELONGS_TO]->(t)
-		OPTIONAL MATCH (s:Section)<-[:HAS_SECTION]-(d)
-		OPTIONAL MATCH (e:Exercise)-[:BELONGS_TO]->(t)
-		OPTIONAL MATCH (a:Answer)-[:ANSWERS]->(e)
-		DETACH DELETE t, d, s, e, a
-		"""
-	)
+	# Primero el contenido de cada tema y luego los temas
+	detach_delete_in_batches("MATCH (t:Topic)\n" + _TOPIC_CONTENT_NODES)
+	detach_delete_in_batches("MATCH (n:Topic)")
 	print("✅ Todos los temas eliminados")
 
 
@@ -69,40 +73,15 @@ def clean_all_data() -> None:
 	"""
 	print("⚠️  ELIMINANDO TODOS LOS DATOS DE LA BASE DE DATOS...")
 	
-	# Eliminar todo en orden para evitar problemas de referencias
-	# DETACH DELETE elimina los nodos y todas sus relaciones automáticamente
-	
-	print("   - Eliminando respuestas (Answer)...")
-	run_query("MATCH (a:Answer) DETACH DELETE a")
-	
-	print("   - Eliminando ejercicios (Exercise)...")
-	run_query("MATCH (e:Exercise) DETACH DELETE e")
-	
-	print("   - Eliminando secciones (Section)...")
-	run_query("MATCH (s:Section) DETACH DELETE s")
-	
-	print("   - Eliminando documentos (Document)...")
-	run_query("MATCH (d:Document) DETACH DELETE d")
-	
-	print("   - Eliminando sesiones de estudio (StudySession)...")
-	run_query("MATCH (ss:StudySession) DETACH DELETE ss")
-	
-	print("   - Eliminando estudiantes (Student)...")
-	run_query("MATCH (s:Student) DETACH DELETE s")
-	
-	print("   - Eliminando temas (Topic)...")
-	run_query("MATCH (t:Topic) DETACH DELETE t")
-	
-	# Eliminar cualquier relación residual (por si acaso)
-	print("   - Limpiando relaciones residuales...")
-	run_query("MATCH ()-[r:KNOWS]->() DELETE r")
-	run_query("MATCH ()-[r:HAS_SESSION]->() DELETE r")
-	run_query("MATCH ()-[r:CONSULTED_TOPIC]->() DELETE r")
-	run_query("MATCH ()-[r:USED_DOCUMENT]->() DELETE r")
-	run_query("MATCH ()-[r:HAS_ANSWER]->() DELETE r")
-	run_query("MATCH ()-[r:ANSWERS]->() DELETE r")
-	run_query("MATCH ()-[r:BELONGS_TO]->() DELETE r")
-	run_query("MATCH ()-[r:HAS_SECTION]->() DELETE r")
+	# Una sola consulta por lotes: DETACH DELETE elimina los nodos y todas sus relaciones,
+	# y IN TRANSACTIONS confirma cada 10000 nodos para no cargar todo en una transacción
+	print("   - Eliminando respuestas, ejercicios, secciones, documentos, sesiones, estudiantes y temas...")
+	detach_delete_in_batches(
+		"""
+		MATCH (n)
+		WHERE n:Answer OR n:Exercise OR n:Section OR n:Document OR n:StudySession OR n:Student OR n:Topic
+		"""
+	)
 	
 	print("✅ Todos los datos eliminados completamente")
 
@@ -111,46 +90,39 @@ def show_stats() -> None:
 	"""Muestra estadísticas de la base de datos."""
 	print("\n📊 Estadísticas de la base de datos:")
 	
-	# Contar temas
-	result = run_query("MATCH (t:Topic) RETURN count(t) AS count", {})
-	print(f"   - Temas: {result[0]['count']}")
-	
-	# Contar documentos
-	result = run_query("MATCH (d:Document) RETURN count(d) AS count", {})
-	print(f"   - Documentos: {result[0]['count']}")
-	
-	# Contar secciones
-	result = run_query("MATCH (s:Section) RETURN count(s) AS count", {})
-	print(f"   - Secciones: {result[0]['count']}")
-	
-	# Contar ejercicios
-	result = run_query("MATCH (e:Exercise) RETURN count(e) AS count", {})
-	print(f"   - Ejercicios: {result[0]['count']}")
-	
-	# Contar estudiantes
-	result = run_query("MATCH (s:Student) RETURN count(s) AS count", {})
-	print(f"   - Estudiantes: {result[0]['count']}")
-	
-	# Contar sesiones de estudio
-	result = run_query("MATCH (ss:StudySession) RETURN count(ss) AS count", {})
-	print(f"   - Sesiones de estudio: {result[0]['count']}")
-	
-	# Contar respuestas
-	result = run_query("MATCH (a:Answer) RETURN count(a) AS count", {})
-	print(f"   - Respuestas: {result[0]['count']}")
-	
-	# Contar ejercicios por tema
+	# Todos los conteos y los ejercicios por tema en una sola consulta
 	result = run_query(
 		"""
-		MATCH (e:Exercise)-[:BELONGS_TO]->(t:Topic)
-		RETURN t.nombre AS tema, count(e) AS count
-		ORDER BY count DESC
+		CALL { MATCH (t:Topic) RETURN count(t) AS topics }
+		CALL { MATCH (d:Document) RETURN count(d) AS documents }
+		CALL { MATCH (s:Section) RETURN count(s) AS sections }
+		CALL { MATCH (e:Exercise) RETURN count(e) AS exercises }
+		CALL { MATCH (s:Student) RETURN count(s) AS students }
+		CALL { MATCH (ss:StudySession) RETURN count(ss) AS sessions }
+		CALL { MATCH (a:Answer) RETURN count(a) AS answers }
+		CALL {
+			MATCH (e:Exercise)-[:BELONGS_TO]->(t:Topic)
+			WITH t.nombre AS tema, count(e) AS count
+			ORDER BY count DESC
+			RETURN collect({tema: tema, count: count}) AS por_tema
+		}
+		RETURN topics, documents, sections, exercises, students, sessions, answers, por_tema
 		""",
-		{}
+		{},
+		write=False,
 	)
-	if result:
+	stats = result[0]
+	print(f"   - Temas: {stats['topics']}")
+	print(f"   - Documentos: {stats['documents']}")
+	print(f"   - Secciones: {stats['sections']}")
+	print(f"   - Ejercicios: {stats['exercises']}")
+	print(f"   - Estudiantes: {stats['students']}")
+	print(f"   - Sesiones de estudio: {stats['sessions']}")
+	print(f"   - Respuestas: {stats['answers']}")
+	
+	if stats["por_tema"]:
 		print("\n   Ejercicios por tema:")
-		for r in result:
+		for r in stats["por_tema"]:
 			print(f"      - {r['tema']}: {r['count']} ejercicios")
 
 
@@ -161,6 +133,9 @@ def main() -> None:
 		print("Error: Faltan credenciales de Neo4j. Configura NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD", file=sys.stderr)
 		sys.exit(1)
 	
+	# Constraints por id: las búsquedas por id y los conteos por etiqueta usan sus índices
+	apply_schema()
+	
 	# Mostrar estadísticas actuales
 	print("📊 Estadísticas ANTES de limpiar:")
 	show_stats()
@@ -14,25 +14,21 @@ if _ROOT not in sys.path:
 	sys.path.insert(0, _ROOT)
 
 from app.config import get_config
-from app.db.neo4j_client import run_query
+from app.db.neo4j_client import apply_schema, detach_delete_in_batches, run_query
 
 
 def clean_all_exercises() -> None:
 	"""Elimina todos los ejercicios y sus respuestas."""
 	print("⚠️  ELIMINANDO TODOS LOS EJERCICIOS...")
 	
-	# Eliminar respuestas primero (tienen relaciones con ejercicios)
-	print("   - Eliminando respuestas (Answer)...")
-	run_query("MATCH (a:Answer) DETACH DELETE a")
-	
-	# Eliminar ejercicios
-	print("   - Eliminando ejercicios (Exercise)...")
-	run_query("MATCH (e:Exercise) DETACH DELETE e")
-	
-	# Limpiar relaciones residuales
-	print("   - Limpiando relaciones residuales...")
-	run_query("MATCH ()-[r:ANSWERS]->() DELETE r")
-	run_query("MATCH ()-[r:HAS_ANSWER]->() DELETE r")
+	# DETACH DELETE elimina también ANSWERS/HAS_ANSWER; IN TRANSACTIONS confirma por lotes
+	print("   - Eliminando respuestas (Answer) y ejercicios (Exercise)...")
+	detach_delete_in_batches(
+		"""
+		MATCH (n)
+		WHERE n:Answer OR n:Exercise
+		"""
+	)
 	
 	print("✅ Todos los ejercicios eliminados")
 
@@ -41,26 +37,29 @@ def show_stats() -> None:
 	"""Muestra estadísticas de ejercicios en la base de datos."""
 	print("📊 Estadísticas de ejercicios:")
 	
-	# Contar ejercicios
-	result = run_query("MATCH (e:Exercise) RETURN count(e) AS count", {})
-	print(f"   - Ejercicios: {result[0]['count']}")
-	
-	# Contar respuestas
-	result = run_query("MATCH (a:Answer) RETURN count(a) AS count", {})
-	print(f"   - Respuestas: {result[0]['count']}")
-	
-	# Contar ejercicios por tema
+	# Conteos y ejercicios por tema en una sola consulta
 	result = run_query(
 		"""
-		MATCH (e:Exercise)-[:BELONGS_TO]->(t:Topic)
-		RETURN t.nombre AS tema, count(e) AS count
-		ORDER BY count DESC
+		CALL { MATCH (e:Exercise) RETURN count(e) AS exercises }
+		CALL { MATCH (a:Answer) RETURN count(a) AS answers }
+		CALL {
+			MATCH (e:Exercise)-[:BELONGS_TO]->(t:Topic)
+			WITH t.nombre AS tema, count(e) AS count
+			ORDER BY count DESC
+			RETURN collect({tema: tema, count: count}) AS por_tema
+		}
+		RETURN exercises, answers, por_tema
 		""",
-		{}
+		{},
+		write=False,
 	)
-	if result:
+	stats = result[0]
+	print(f"   - Ejercicios: {stats['exercises']}")
+	print(f"   - Respuestas: {stats['answers']}")
+	
+	if stats["por_tema"]:
 		print("\n   Ejercicios por tema:")
-		for r in result:
+		for r in stats["por_tema"]:
 			print(f"      - {r['tema']}: {r['count']} ejercicios")
 	else:
 		print("\n   No hay ejercicios asociados a temas")
@@ -73,6 +72,9 @@ def main() -> None:
 		print("Error: Faltan credenciales de Neo4j. Configura NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD", file=sys.stderr)
 		sys.exit(1)
 	
+	# Constraints por id: las búsquedas por id y los conteos por etiqueta usan sus índices
+	apply_schema()
+	
 	# Mostrar estadísticas actuales
 	print("📊 Estadísticas ANTES de limpiar:")
 	show_stats()
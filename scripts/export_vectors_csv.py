@@ -1,18 +1,27 @@
 from __future__ import annotations
 
+import csv
 import os
 import sys
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List
 
-import pandas as pd
 import typer
 
+try:
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is optional (only for --format parquet)
+	pa = None
+	pq = None
+
 # Ensure project root is on sys.path for 'app' imports when running as a script
 _ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if _ROOT not in sys.path:
 	sys.path.insert(0, _ROOT)
 
-from app.db.neo4j_client import run_query
+from app.db.neo4j_client import stream_query
 
 
 app = typer.Typer(add_completion=False)
@@ -23,72 +32,91 @@ def _ensure_out_dir(out_dir: str) -> None:
 		os.makedirs(out_dir, exist_ok=True)
 
 
-def _rows_for_document() -> List[Tuple[str, str]]:
-	cypher = """
-	MATCH (d:Document)
-	RETURN d.id AS id, d.nombre AS nombre, d.content AS content
-	"""
-	rows: List[Tuple[str, str]] = []
-	for r in run_query(cypher, {}):
-		_id = r["id"]
-		nombre = r.get("nombre") or ""
-		content = r.get("content") or ""
-		text = (nombre + ("\n\n" if nombre and content else "") + content).strip()
-		if _id and text:
-			rows.append((_id, text))
-	return rows
-
-
-def _rows_for_section() -> List[Tuple[str, str]]:
-	cypher = """
-	MATCH (s:Section)
-	RETURN s.id AS id, s.content AS content
-	"""
-	rows: List[Tuple[str, str]] = []
-	for r in run_query(cypher, {}):
-		_id = r["id"]
-		content = (r.get("content") or "").strip()
-		if _id and content:
-			rows.append((_id, content))
-	return rows
-
-
-def _rows_for_exercise() -> List[Tuple[str, str]]:
-	cypher = """
-	MATCH (e:Exercise)
-	RETURN e.id AS id, e.task AS task
+# Records requested per fetch: the driver buffers the next batch while the previous one is written
+_EXPORT_FETCH_SIZE = 10000
+
+
+def _stream_label_to_csv(cypher: str, out_path: str) -> None:
 	"""
-	rows: List[Tuple[str, str]] = []
-	for r in run_query(cypher, {}):
-		_id = r["id"]
-		task = (r.get("task") or "").strip()
-		if _id and task:
-			rows.append((_id, task))
-	return rows
-
-
-def _rows_for_topic() -> List[Tuple[str, str]]:
-	cypher = """
-	MATCH (t:Topic)
-	RETURN t.id AS id, t.nombre AS nombre
+	Writes the id,content rows of cypher to out_path as records stream in.
+	The queries build and filter the content server-side, so rows are written as-is.
 	"""
-	rows: List[Tuple[str, str]] = []
-	for r in run_query(cypher, {}):
-		_id = r["id"]
-		nombre = (r.get("nombre") or "").strip()
-		if _id and nombre:
-			rows.append((_id, nombre))
-	return rows
+	with open(out_path, "w", encoding="utf-8", newline="") as f:
+		writer = csv.writer(f, lineterminator="\n")
+		writer.writerow(["id", "content"])
+		writer.writerows((r["id"], r["content"]) for r in stream_query(cypher, write=False, fetch_size=_EXPORT_FETCH_SIZE))
 
 
-def _write_csv(rows: List[Tuple[str, str]], out_path: str) -> None:
-	df = pd.DataFrame(rows, columns=["id", "content"])
-	df.to_csv(out_path, index=False)
+_PARQUET_BATCH_ROWS = 1000
+
+
+def _stream_label_to_parquet(cypher: str, out_path: str) -> None:
+	"""
+	Parquet variant of _stream_label_to_csv (snappy-compressed id, content columns),
+	written in row groups of _PARQUET_BATCH_ROWS as records stream in.
+	"""
+	schema = pa.schema([("id", pa.string()), ("content", pa.string())])
+	records = stream_query(cypher, write=False, fetch_size=_EXPORT_FETCH_SIZE)
+	with pq.ParquetWriter(out_path, schema, compression="snappy") as writer:
+		while True:
+			batch = list(islice(records, _PARQUET_BATCH_ROWS))
+			if not batch:
+				break
+			writer.write_table(pa.table({
+				"id": [r["id"] for r in batch],
+				"content": [r["content"] for r in batch],
+			}, schema=schema))
+
+
+_WRITERS = {
+	"csv": _stream_label_to_csv,
+	"parquet": _stream_label_to_parquet,
+}
+
+
+_DOCUMENT_CYPHER = """
+MATCH (d:Document)
+WITH d.id AS id, coalesce(d.nombre, '') AS nombre, coalesce(d.content, '') AS content
+WITH id, trim(nombre + CASE WHEN nombre <> '' AND content <> '' THEN '\\n\\n' ELSE '' END + content) AS content
+WHERE id IS NOT NULL AND id <> '' AND content <> ''
+RETURN id, content
+"""
+
+_SECTION_CYPHER = """
+MATCH (s:Section)
+WITH s.id AS id, trim(coalesce(s.content, '')) AS content
+WHERE id IS NOT NULL AND id <> '' AND content <> ''
+RETURN id, content
+"""
+
+_EXERCISE_CYPHER = """
+MATCH (e:Exercise)
+WITH e.id AS id, trim(coalesce(e.task, '')) AS content
+WHERE id IS NOT NULL AND id <> '' AND content <> ''
+RETURN id, content
+"""
+
+_TOPIC_CYPHER = """
+MATCH (t:Topic)
+WITH t.id AS id, trim(coalesce(t.nombre, '')) AS content
+WHERE id IS NOT NULL AND id <> '' AND content <> ''
+RETURN id, content
+"""
+
+
+# Lowercase label name -> export query; the output file is <name>.<format>
+EXPORTERS = {
+	"document": _DOCUMENT_CYPHER,
+	"section": _SECTION_CYPHER,
+	"exercise": _EXERCISE_CYPHER,
+	"topic": _TOPIC_CYPHER,
+}
 
 
 @app.command()
 def main(
 	out_dir: str = typer.Option("data", help="Output directory for CSV files"),
+	fmt: str = typer.Option("csv", "--format", help="Output format: csv|parquet (parquet requires pyarrow)"),
 	labels: List[str] = typer.Option(
 		None,
 		"--label",
@@ -96,26 +124,26 @@ def main(
 	),
 ) -> None:
 	"""
-	Export current nodes that can be vectorized into CSV files with columns: id, content.
-	File names: <label>.csv (lowercase), e.g., document.csv
+	Export current nodes that can be vectorized into CSV (or Parquet) files with columns: id, content.
+	File names: <label>.<format> (lowercase), e.g., document.csv
 	"""
-	labels_to_export = [l.strip() for l in labels] if labels else ["Document", "Section", "Exercise", "Topic"]
-	label_set = {l.lower() for l in labels_to_export}
+	fmt = fmt.strip().lower()
+	if fmt not in _WRITERS:
+		raise typer.BadParameter("--format must be csv or parquet")
+	if fmt == "parquet" and pq is None:
+		raise typer.BadParameter("--format parquet requires pyarrow (pip install pyarrow)")
+	write_label = _WRITERS[fmt]
+	label_set = {l.strip().lower() for l in labels} if labels else set(EXPORTERS)
 
 	_ensure_out_dir(out_dir)
 
-	if "document".lower() in label_set:
-		rows = _rows_for_document()
-		_write_csv(rows, os.path.join(out_dir, "document.csv"))
-	if "section".lower() in label_set:
-		rows = _rows_for_section()
-		_write_csv(rows, os.path.join(out_dir, "section.csv"))
-	if "exercise".lower() in label_set:
-		rows = _rows_for_exercise()
-		_write_csv(rows, os.path.join(out_dir, "exercise.csv"))
-	if "topic".lower() in label_set:
-		rows = _rows_for_topic()
-		_write_csv(rows, os.path.join(out_dir, "topic.csv"))
+	jobs = [(cypher, os.path.join(out_dir, f"{name}.{fmt}")) for name, cypher in EXPORTERS.items() if name in label_set]
+
+	# Labels are independent: each export streams on its own pooled session, so they overlap
+	if jobs:
+		with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+			for future in [pool.submit(write_label, cypher, path) for cypher, path in jobs]:
+				future.result()
 
 	typer.echo(f"Export completed to: {out_dir}")
 
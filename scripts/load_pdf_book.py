@@ -9,20 +9,27 @@ from __future__ import annotations
 import os
 import re
 import sys
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from pypdf import PdfReader
 from tqdm import tqdm
 
+try:
+	import pypdfium2 as pdfium
+except ImportError:  # pragma: no cover - pypdfium2 is optional (faster text extraction)
+	pdfium = None
+
 # Ensure project root is on sys.path for 'app' imports when running as a script
 _ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if _ROOT not in sys.path:
 	sys.path.insert(0, _ROOT)
 
 from app.config import get_config
-from app.db.neo4j_client import run_query
+from app.db.neo4j_client import run_query, run_query_batch, run_write
+from app.embeddings.cache import cache_key
 from app.embeddings.ollama_embeddings import OllamaEmbeddingClient
-from app.agent.tools import ensure_vector_indexes
+from app.agent.tools import ensure_vector_indexes, find_best_topics_for_exercises, load_topic_vectors
 
 
 # Configuración
@@ -34,8 +41,17 @@ PDF_PATH = os.path.join(_ROOT, "vector", "Libro Arquitectura de Computadoras San
 MAX_SECTION_SIZE = 1000
 MIN_SECTION_SIZE = 100
 
-# Tamaño de batch para vectorización
-BATCH_SIZE = 10
+# Textos por request de embeddings (/api/embed) y por UNWIND de vectores
+BATCH_SIZE = 32
+
+# Requests de embeddings en paralelo (Ollama los atiende hasta OLLAMA_NUM_PARALLEL)
+EMBED_WORKERS = 4
+
+# Filas por sentencia UNWIND al escribir en Neo4j
+WRITE_BATCH_SIZE = 500
+
+# Procesos máximos para extraer el texto de las páginas del PDF
+PDF_WORKERS = 8
 
 # Configuración para ejercicios
 EXERCISE_PATTERNS = [
@@ -46,6 +62,83 @@ EXERCISE_PATTERNS = [
 ]
 MIN_EXERCISE_LENGTH = 20
 
+# Patrones compilados una sola vez; se prueban en orden y gana el primero que encuentra resultados
+_EXERCISE_RES = [re.compile(p, re.IGNORECASE | re.MULTILINE) for p in EXERCISE_PATTERNS]
+
+# Posibles encabezados de capítulo (patrones comunes)
+_CHAPTER_RES = [
+	re.compile(p, re.IGNORECASE | re.MULTILINE)
+	for p in (
+		r'CAP[ÍI]TULO\s+\d+[.:]?\s*([^\n]+)',
+		r'Capítulo\s+\d+[.:]?\s*([^\n]+)',
+		r'^(\d+[.:]\s+[A-ZÁÉÍÓÚÑ][^\n]{10,})(?=\n)',
+	)
+]
+# 3+ saltos de línea (-> párrafo) o espacios/tabs consecutivos (-> un espacio)
+_WHITESPACE_RE = re.compile(r'\n{3,}|[ \t]+')
+_CHAPTER_TITLE_RE = re.compile(r'CAP[ÍI]TULO\s+\d+[.:]?\s*(.+?)(?:\n|$)', re.IGNORECASE)
+_NUMBERED_TITLE_RE = re.compile(r'\d+[.:]\s*(.+?)(?:\n|$)')
+
+
+# PdfReader de cada proceso de extracción (el PDF se abre una vez por proceso)
+_worker_reader: Optional[PdfReader] = None
+
+
+def _init_page_worker(pdf_path: str) -> None:
+	global _worker_reader
+	_worker_reader = PdfReader(pdf_path)
+
+
+def _extract_page(page_num: int) -> Tuple[str, Optional[str]]:
+	"""Retorna (texto, error) de una página; se ejecuta en un proceso de extracción."""
+	try:
+		return _worker_reader.pages[page_num].extract_text() or "", None
+	except Exception as e:
+		return "", str(e)
+
+
+def _iter_pdfium_pages(pdf_path: str) -> Iterator[str]:
+	"""Texto de cada página con PDFium (C++), de a una página por vez."""
+	pdf = pdfium.PdfDocument(pdf_path)
+	try:
+		for page_num in tqdm(range(len(pdf)), desc="Extrayendo páginas"):
+			page = pdf[page_num]
+			try:
+				textpage = page.get_textpage()
+				try:
+					# PDFium separa las líneas con \r\n
+					yield textpage.get_text_range().replace("\r\n", "\n")
+				finally:
+					textpage.close()
+			except Exception as e:
+				print(f"Error extrayendo página {page_num + 1}: {e}", file=sys.stderr)
+			finally:
+				page.close()
+	finally:
+		pdf.close()
+
+
+def iter_pdf_pages(pdf_path: str) -> Iterator[str]:
+	"""
+	Genera el texto de cada página no vacía, en orden.
+	Usa pypdfium2 si está instalado; si no, pypdf (Python puro, limitado por el GIL),
+	repartiendo las páginas entre procesos.
+	"""
+	if pdfium is not None:
+		for text in _iter_pdfium_pages(pdf_path):
+			if text.strip():
+				yield text
+		return
+	num_pages = len(PdfReader(pdf_path).pages)
+	workers = min(os.cpu_count() or 1, PDF_WORKERS)
+	with ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker, initargs=(pdf_path,)) as pool:
+		results = pool.map(_extract_page, range(num_pages), chunksize=8)
+		for page_num, (text, error) in enumerate(tqdm(results, total=num_pages, desc="Extrayendo páginas")):
+			if error is not None:
+				print(f"Error extrayendo página {page_num + 1}: {error}", file=sys.stderr)
+			elif text.strip():
+				yield text
+
 
 def extract_text_from_pdf(pdf_path: str) -> str:
 	"""Extrae todo el texto del PDF."""
@@ -53,22 +146,16 @@ def extract_text_from_pdf(pdf_path: str) -> str:
 	if not os.path.exists(pdf_path):
 		raise FileNotFoundError(f"PDF no encontrado: {pdf_path}")
 	
-	reader = PdfReader(pdf_path)
-	text_parts = []
-	
-	for page_num, page in enumerate(tqdm(reader.pages, desc="Extrayendo páginas")):
-		try:
-			text = page.extract_text()
-			if text.strip():
-				text_parts.append(text)
-		except Exception as e:
-			print(f"Error extrayendo página {page_num + 1}: {e}", file=sys.stderr)
-	
-	full_text = "\n\n".join(text_parts)
+	# join consume las páginas a medida que se extraen, sin una lista intermedia de textos
+	full_text = "\n\n".join(iter_pdf_pages(pdf_path))
 	print(f"Texto extraído: {len(full_text)} caracteres")
 	return full_text
 
 
+# Caracteres donde se prefiere cortar un chunk
+_CHUNK_BREAKS = ".!?\n"
+
+
 def split_text_into_chunks(text: str, chunk_size: int = MAX_SECTION_SIZE, overlap: int = 100) -> List[str]:
 	"""
 	Divide el texto en chunks con overlap para mantener contexto.
@@ -83,15 +170,11 @@ def split_text_into_chunks(text: str, chunk_size: int = MAX_SECTION_SIZE, overla
 		# Si no es el último chunk, intentar cortar en un punto lógico (final de oración, párrafo, etc.)
 		if end < text_length:
 			# Buscar el último punto, signo de exclamación, o pregunta en el último 20% del chunk
+			# (o salto de línea); rfind recorre el texto en C en lugar de un bucle carácter a carácter
 			search_start = max(start, end - (chunk_size // 5))
-			for i in range(end - 1, search_start - 1, -1):
-				if text[i] in '.!?\n':
-					end = i + 1
-					break
-				# Si encontramos un salto de línea doble (párrafo), también es un buen punto de corte
-				if i > 0 and text[i] == '\n' and text[i-1] == '\n':
-					end = i + 1
-					break
+			cut = max(text.rfind(c, search_start, end) for c in _CHUNK_BREAKS)
+			if cut >= 0:
+				end = cut + 1
 		
 		chunk = text[start:end].strip()
 		if chunk and len(chunk) >= MIN_SECTION_SIZE:
@@ -124,22 +207,15 @@ def split_into_sections(text: str) -> List[Dict[str, Any]]:
 	print("Dividiendo texto en secciones...")
 	
 	# Limpiar el texto
-	text = re.sub(r'\n{3,}', '\n\n', text)  # Normalizar saltos de línea múltiples
-	text = re.sub(r'[ \t]+', ' ', text)  # Normalizar espacios
-	
-	# Detectar posibles capítulos (patrones comunes)
-	chapter_patterns = [
-		r'CAP[ÍI]TULO\s+\d+[.:]?\s*([^\n]+)',
-		r'Capítulo\s+\d+[.:]?\s*([^\n]+)',
-		r'^(\d+[.:]\s+[A-ZÁÉÍÓÚÑ][^\n]{10,})(?=\n)',
-	]
+	# Normalizar saltos de línea múltiples y espacios en una sola pasada
+	text = _WHITESPACE_RE.sub(lambda m: '\n\n' if m.group(0)[0] == '\n' else ' ', text)
 	
 	# Intentar encontrar capítulos
 	chapters = []
 	chapter_positions = []
 	
-	for pattern in chapter_patterns:
-		matches = list(re.finditer(pattern, text, re.IGNORECASE | re.MULTILINE))
+	for pattern in _CHAPTER_RES:
+		matches = list(pattern.finditer(text))
 		if matches and len(matches) > 2:  # Si encontramos más de 2 capítulos, es probable que sea correcto
 			for match in matches:
 				chapter_title = match.group(1) if match.groups() else f"Capítulo {len(chapters) + 1}"
@@ -159,11 +235,11 @@ def split_into_sections(text: str) -> List[Dict[str, Any]]:
 			chapter_text = text[start_pos:end_pos].strip()
 			
 			# Extraer el título del capítulo
-			title_match_obj = re.search(r'CAP[ÍI]TULO\s+\d+[.:]?\s*(.+?)(?:\n|$)', title_match, re.IGNORECASE)
+			title_match_obj = _CHAPTER_TITLE_RE.search(title_match)
 			if title_match_obj:
 				chapter_title = title_match_obj.group(1).strip()
 			else:
-				title_match_obj = re.search(r'\d+[.:]\s*(.+?)(?:\n|$)', title_match)
+				title_match_obj = _NUMBERED_TITLE_RE.search(title_match)
 				if title_match_obj:
 					chapter_title = title_match_obj.group(1).strip()
 				else:
@@ -273,50 +349,83 @@ def delete_topic_data() -> None:
 	print("✅ Datos eliminados")
 
 
+def vectorize_nodes(
+	label: str,
+	rows: List[Dict[str, Any]],
+	text_of: Callable[[Dict[str, Any]], str],
+	embed_client: OllamaEmbeddingClient,
+	desc: str,
+	hash_prop: Optional[str] = None,
+) -> None:
+	"""
+	Vectoriza rows ({id, ...}) de a BATCH_SIZE: un request de embeddings y un UNWIND por lote.
+	Hasta EMBED_WORKERS requests en vuelo; cada lote se escribe apenas llega.
+	Con hash_prop, guarda además el hash de modelo + texto (así otros scripts saben si el vector está al día).
+	"""
+	texts = [text_of(r) for r in rows]
+	batches = embed_client.embed_batches(texts, BATCH_SIZE, EMBED_WORKERS)
+	total = (len(rows) + BATCH_SIZE - 1) // BATCH_SIZE
+	cypher = f"UNWIND $rows AS row MATCH (n:{label} {{id: row.id}}) SET n.vector = row.vec"
+	if hash_prop:
+		cypher += f", n.{hash_prop} = row.hash"
+	for i, vectors in zip(range(0, len(rows), BATCH_SIZE), tqdm(batches, total=total, desc=desc)):
+		batch = rows[i:i + BATCH_SIZE]
+		run_write(cypher, {"rows": [
+			{"id": r["id"], "vec": vec, "hash": cache_key(embed_client.model, text)}
+			for r, text, vec in zip(batch, texts[i:i + BATCH_SIZE], vectors)
+		]})
+
+
 def load_documents_and_sections(sections: List[Dict[str, Any]], embed_client: OllamaEmbeddingClient) -> None:
 	"""Carga documentos y secciones en Neo4j y los vectoriza."""
 	print("Cargando documentos y secciones en Neo4j...")
 	
-	# Crear documentos y secciones
-	for doc in tqdm(sections, desc="Creando documentos"):
-		# Crear documento
-		run_query(
+	# Crear documentos y secciones con UNWIND: una sentencia por lote en lugar de una por nodo
+	docs_payload = [
+		{"id": doc["id"], "nombre": doc["nombre"], "content": doc["content"]}
+		for doc in sections
+	]
+	secs_payload = [
+		{"doc_id": doc["id"], "id": section["id"], "content": section["content"]}
+		for doc in sections
+		for section in doc["sections"]
+	]
+	# Todos los lotes en una sola transacción: un único commit para documentos y secciones
+	queries = [
+		(
 			"""
 			MATCH (t:Topic {id: $topic_id})
-			MERGE (d:Document {id: $doc_id})
-			SET d.nombre = $nombre, d.content = $content
+			UNWIND $docs AS row
+			MERGE (d:Document {id: row.id})
+			SET d.nombre = row.nombre, d.content = row.content
 			MERGE (d)-[:BELONGS_TO]->(t)
 			""",
-			{
-				"topic_id": TOPIC_ID,
-				"doc_id": doc["id"],
-				"nombre": doc["nombre"],
-				"content": doc["content"]
-			}
+			{"topic_id": TOPIC_ID, "docs": docs_payload[i:i + WRITE_BATCH_SIZE]},
 		)
-		
-		# Crear secciones
-		for section in doc["sections"]:
-			run_query(
-				"""
-				MATCH (d:Document {id: $doc_id})
-				MERGE (s:Section {id: $section_id})
-				SET s.content = $content
-				MERGE (d)-[:HAS_SECTION]->(s)
-				""",
-				{
-					"doc_id": doc["id"],
-					"section_id": section["id"],
-					"content": section["content"]
-				}
-			)
+		for i in range(0, len(docs_payload), WRITE_BATCH_SIZE)
+	]
+	queries += [
+		(
+			"""
+			UNWIND $secs AS row
+			MATCH (d:Document {id: row.doc_id})
+			MERGE (s:Section {id: row.id})
+			SET s.content = row.content
+			MERGE (d)-[:HAS_SECTION]->(s)
+			""",
+			{"secs": secs_payload[i:i + WRITE_BATCH_SIZE]},
+		)
+		for i in range(0, len(secs_payload), WRITE_BATCH_SIZE)
+	]
+	print(f"Creando {len(docs_payload)} documentos y {len(secs_payload)} secciones...")
+	run_query_batch(queries)
 	
 	# Vectorizar temas
 	# IMPORTANTE: Usar el mismo modelo de embeddings (mxbai-embed-large) para mantener consistencia
 	print("Vectorizando temas...")
 	topic_text = TOPIC_NAME
 	topic_vector = embed_client.embed(topic_text)
-	run_query(
+	run_write(
 		"MATCH (t:Topic {id: $id}) SET t.vector = $vec",
 		{"id": TOPIC_ID, "vec": topic_vector}
 	)
@@ -330,13 +439,9 @@ def load_documents_and_sections(sections: List[Dict[str, Any]], embed_client: Ol
 		{"topic_id": TOPIC_ID}
 	)
 	
-	for doc in tqdm(documents, desc="Vectorizando documentos"):
-		doc_text = f"{doc['nombre']}\n\n{doc['content']}"
-		doc_vector = embed_client.embed(doc_text)
-		run_query(
-			"MATCH (d:Document {id: $id}) SET d.vector = $vec",
-			{"id": doc["id"], "vec": doc_vector}
-		)
+	vectorize_nodes(
+		"Document", documents, lambda doc: f"{doc['nombre']}\n\n{doc['content']}", embed_client, "Vectorizando documentos"
+	)
 	
 	# Vectorizar secciones
 	# IMPORTANTE: Mismo modelo de embeddings para consistencia en búsquedas
@@ -349,16 +454,7 @@ def load_documents_and_sections(sections: List[Dict[str, Any]], embed_client: Ol
 		{"topic_id": TOPIC_ID}
 	)
 	
-	# Vectorizar en batches
-	for i in tqdm(range(0, len(sections_list), BATCH_SIZE), desc="Procesando secciones"):
-		batch = sections_list[i:i+BATCH_SIZE]
-		for section in batch:
-			section_text = section["content"]
-			section_vector = embed_client.embed(section_text)
-			run_query(
-				"MATCH (s:Section {id: $id}) SET s.vector = $vec",
-				{"id": section["id"], "vec": section_vector}
-			)
+	vectorize_nodes("Section", sections_list, lambda section: section["content"], embed_client, "Procesando secciones")
 	
 	print(f"Vectorización completa: {len(documents)} documentos, {len(sections_list)} secciones")
 
@@ -380,10 +476,10 @@ def extract_exercises_from_text(text: str) -> List[Dict[str, Any]]:
 	]
 	
 	# Buscar ejercicios individuales
-	for pattern in EXERCISE_PATTERNS:
-		matches = list(re.finditer(pattern, text, re.IGNORECASE | re.MULTILINE))
+	for pattern in _EXERCISE_RES:
+		matches = list(pattern.finditer(text))
 		if matches:
-			print(f"Encontrados {len(matches)} ejercicios con patrón: {pattern}")
+			print(f"Encontrados {len(matches)} ejercicios con patrón: {pattern.pattern}")
 			
 			for i, match in enumerate(matches):
 				# Determinar el rango de texto para este ejercicio
@@ -435,6 +531,14 @@ def extract_exercises_from_text(text: str) -> List[Dict[str, Any]]:
 	return exercises
 
 
+# Palabras indicadoras de dificultad: una alternativa por nivel, sin distinguir mayúsculas
+# (coinciden también dentro de otras palabras, p. ej. "define" en "definen")
+_DIFFICULTY_LOW_RE = re.compile("|".join(map(re.escape, ["qué es", "define", "explica qué", "nombra"])), re.IGNORECASE)
+_DIFFICULTY_MEDIUM_RE = re.compile("|".join(map(re.escape, ["represente", "complete", "indique", "muestra"])), re.IGNORECASE)
+_DIFFICULTY_HIGH_RE = re.compile("|".join(map(re.escape, ["calcule", "diseñe", "implemente", "analice", "resuelva"])), re.IGNORECASE)
+_LONG_NUMBER_RE = re.compile(r'\d{4,}')
+
+
 def estimate_difficulty(task: str) -> float:
 	"""
 	Estima la dificultad de un ejercicio basándose en características del texto.
@@ -443,16 +547,16 @@ def estimate_difficulty(task: str) -> float:
 	difficulty = 0.3  # Base
 	
 	# Indicadores de dificultad baja (0.2-0.4)
-	if any(word in task.lower() for word in ['qué es', 'define', 'explica qué', 'nombra']):
+	if _DIFFICULTY_LOW_RE.search(task):
 		difficulty = 0.2
 	# Indicadores de dificultad media (0.4-0.6)
-	elif any(word in task.lower() for word in ['represente', 'complete', 'indique', 'muestra']):
+	elif _DIFFICULTY_MEDIUM_RE.search(task):
 		difficulty = 0.5
 	# Indicadores de dificultad alta (0.6-0.8)
-	elif any(word in task.lower() for word in ['calcule', 'diseñe', 'implemente', 'analice', 'resuelva']):
+	elif _DIFFICULTY_HIGH_RE.search(task):
 		difficulty = 0.7
 	# Si tiene tablas o datos numéricos complejos
-	elif re.search(r'\d{4,}', task):  # Números largos (como códigos hexadecimales)
+	elif _LONG_NUMBER_RE.search(task):  # Números largos (como códigos hexadecimales)
 		difficulty = 0.6
 	
 	# Ajustar por longitud (ejercicios largos suelen ser más difíciles)
@@ -464,24 +568,6 @@ def estimate_difficulty(task: str) -> float:
 	return round(difficulty, 2)
 
 
-def find_best_topic_for_exercise(task: str, embed_client: OllamaEmbeddingClient, default_topic_id: str) -> str:
-	"""
-	Encuentra el tema más relevante para un ejercicio basándose en su contenido.
-	Si no encuentra un tema relevante, usa el tema por defecto.
-	"""
-	from app.agent.tools import find_topic_by_text
-	
-	# Buscar el tema más relevante usando vectorización
-	# Usamos un umbral más bajo (0.7) para permitir más flexibilidad
-	topic = find_topic_by_text(task, min_similarity=0.7)
-	
-	if topic and topic.get("id"):
-		return topic["id"]
-	
-	# Si no encuentra un tema, usar el tema por defecto
-	return default_topic_id
-
-
 def load_exercises(exercises: List[Dict[str, Any]], embed_client: OllamaEmbeddingClient) -> None:
 	"""
 	Carga ejercicios en Neo4j y los vectoriza.
@@ -490,73 +576,84 @@ def load_exercises(exercises: List[Dict[str, Any]], embed_client: OllamaEmbeddin
 	"""
 	print(f"Cargando {len(exercises)} ejercicios en Neo4j...")
 	
-	exercise_counter = 0
+	# Vectorizar los enunciados una sola vez: el mismo vector elige el tema y se guarda en el ejercicio
+	# IMPORTANTE: Mismo modelo de embeddings (mxbai-embed-large) para consistencia en búsquedas
+	tasks = [exercise["task"] for exercise in exercises]
+	exercise_vectors: List[List[float]] = []
+	batches = embed_client.embed_batches(tasks, BATCH_SIZE, EMBED_WORKERS)
+	total = (len(tasks) + BATCH_SIZE - 1) // BATCH_SIZE
+	for vectors in tqdm(batches, total=total, desc="Vectorizando ejercicios"):
+		exercise_vectors.extend(vectors)
+	
+	# Tema más relevante de cada ejercicio: vectores de los temas leídos una vez y un solo producto de matrices
+	topic_ids, topic_matrix = load_topic_vectors()
+	best_topic_ids = find_best_topics_for_exercises(exercise_vectors, topic_ids, topic_matrix, TOPIC_ID)
+	
 	topic_stats: Dict[str, int] = {}  # Estadísticas de asociación por tema
+	exercises_payload = []
 	
-	for exercise in tqdm(exercises, desc="Creando ejercicios"):
-		task = exercise["task"]
-		
-		# Estimar dificultad
-		difficulty = estimate_difficulty(task)
-		
-		# Encontrar el tema más relevante para este ejercicio
-		topic_id = find_best_topic_for_exercise(task, embed_client, TOPIC_ID)
-		
+	for exercise_counter, (task, vec, topic_id) in enumerate(zip(tasks, exercise_vectors, best_topic_ids), start=1):
 		# Actualizar estadísticas
 		topic_stats[topic_id] = topic_stats.get(topic_id, 0) + 1
 		
-		# Crear ID del ejercicio
-		exercise_counter += 1
-		exercise_id = f"ex_arquitectura_{exercise_counter:03d}"
-		
-		# Crear ejercicio en Neo4j SIN respuesta (solo task y difficulty)
-		# NOTA: No establecemos la propiedad 'answer' - el ejercicio no tiene respuesta
-		run_query(
+		exercises_payload.append({
+			"id": f"ex_arquitectura_{exercise_counter:03d}",
+			"topic_id": topic_id,
+			"task": task,
+			"difficulty": estimate_difficulty(task),
+			"vec": vec,
+			"hash": cache_key(embed_client.model, task),
+		})
+	
+	# Crear ejercicios en Neo4j SIN respuesta (solo task, difficulty y vector), un UNWIND por lote
+	# NOTA: No establecemos la propiedad 'answer' - el ejercicio no tiene respuesta
+	# Todos los lotes en una sola transacción (un único commit)
+	run_query_batch([
+		(
 			"""
-			MATCH (t:Topic {id: $topic_id})
-			MERGE (e:Exercise {id: $exercise_id})
-			SET e.task = $task, e.difficulty = $difficulty
+			UNWIND $exercises AS ex
+			MATCH (t:Topic {id: ex.topic_id})
+			MERGE (e:Exercise {id: ex.id})
+			SET e.task = ex.task, e.difficulty = ex.difficulty, e.vector = ex.vec, e.task_hash = ex.hash
 			MERGE (e)-[:BELONGS_TO]->(t)
 			""",
-			{
-				"topic_id": topic_id,
-				"exercise_id": exercise_id,
-				"task": task,
-				"difficulty": difficulty
-			}
+			{"exercises": exercises_payload[i:i + WRITE_BATCH_SIZE]},
 		)
+		for i in range(0, len(exercises_payload), WRITE_BATCH_SIZE)
+	])
 	
 	# Mostrar estadísticas de asociación
 	print("\n📊 Estadísticas de asociación de ejercicios:")
-	for topic_id, count in sorted(topic_stats.items(), key=lambda x: x[1], reverse=True):
-		topic_name = run_query(
-			"MATCH (t:Topic {id: $id}) RETURN t.nombre AS nombre",
-			{"id": topic_id}
+	# Nombres de todos los temas en una sola consulta
+	names = {
+		r["id"]: r["nombre"]
+		for r in run_query(
+			"MATCH (t:Topic) WHERE t.id IN $ids RETURN t.id AS id, t.nombre AS nombre",
+			{"ids": list(topic_stats)},
+			write=False,
 		)
-		if topic_name:
-			print(f"   - {topic_name[0]['nombre']}: {count} ejercicios")
+	}
+	for topic_id, count in sorted(topic_stats.items(), key=lambda x: x[1], reverse=True):
+		if topic_id in names:
+			print(f"   - {names[topic_id]}: {count} ejercicios")
 	
-	# Vectorizar ejercicios (todos, sin importar el tema)
-	# IMPORTANTE: Mismo modelo de embeddings (mxbai-embed-large) para consistencia en búsquedas
-	print("\nVectorizando ejercicios...")
-	exercises_list = run_query(
+	# Ejercicios de otros temas que todavía no tienen vector (los del PDF ya lo tienen)
+	unvectorized = run_query(
 		"""
 		MATCH (e:Exercise)
+		WHERE e.vector IS NULL
 		RETURN e.id AS id, e.task AS task
-		"""
+		""",
+		{},
+		write=False,
 	)
-	
-	for exercise in tqdm(exercises_list, desc="Vectorizando ejercicios"):
-		# Vectorizar solo usando task (sin answer)
-		# NOTA: Usa el mismo modelo de embeddings que el resto del sistema
-		exercise_text = exercise['task']
-		exercise_vector = embed_client.embed(exercise_text)
-		run_query(
-			"MATCH (e:Exercise {id: $id}) SET e.vector = $vec",
-			{"id": exercise["id"], "vec": exercise_vector}
+	if unvectorized:
+		print(f"\nVectorizando {len(unvectorized)} ejercicios sin vector...")
+		vectorize_nodes(
+			"Exercise", unvectorized, lambda exercise: exercise["task"], embed_client, "Vectorizando ejercicios", hash_prop="task_hash"
 		)
 	
-	print(f"✅ {len(exercises_list)} ejercicios cargados y vectorizados con modelo: {embed_client.model}")
+	print(f"✅ {len(exercises_payload)} ejercicios cargados y vectorizados con modelo: {embed_client.model}")
 
 
 def main() -> None:
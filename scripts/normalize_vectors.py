@@ -0,0 +1,34 @@
+"""
+Migración única: normaliza a longitud unitaria los vectores guardados en Neo4j.
+Solo hace falta para datos cargados antes de que los embeddings se guardaran normalizados;
+los vectores que ya son unitarios no se modifican.
+"""
+
+from __future__ import annotations
+
+import sys
+import os
+
+# Ensure project root is on sys.path for 'app' imports when running as a script
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _ROOT not in sys.path:
+	sys.path.insert(0, _ROOT)
+
+from app.config import get_config
+from app.agent.tools import normalize_stored_vectors
+
+
+def main() -> None:
+	"""Función principal."""
+	cfg = get_config()
+	if not (cfg.neo4j_uri and cfg.neo4j_user and cfg.neo4j_password):
+		print("Error: Faltan credenciales de Neo4j. Configura NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD", file=sys.stderr)
+		sys.exit(1)
+	
+	print("Normalizando vectores guardados...")
+	normalize_stored_vectors()
+	print("✅ Vectores normalizados")
+
+
+if __name__ == "__main__":
+	main()
@@ -15,31 +15,48 @@ if _ROOT not in sys.path:
 	sys.path.insert(0, _ROOT)
 
 from app.config import get_config
-from app.db.neo4j_client import run_query
+from app.db.neo4j_client import run_query, run_write
+from app.embeddings.cache import cache_key
 from app.embeddings.ollama_embeddings import OllamaEmbeddingClient
-from app.agent.tools import ensure_vector_indexes, find_topic_by_text
+from app.agent.tools import ensure_vector_indexes, find_best_topics_for_exercises, load_topic_vectors
 from tqdm import tqdm
 
 
-def find_best_topic_for_exercise(task: str, embed_client: OllamaEmbeddingClient, default_topic_id: str = "topic_arquitectura") -> str:
-	"""
-	Encuentra el tema más relevante para un ejercicio basándose en su contenido.
-	Si no encuentra un tema relevante, usa el tema por defecto.
-	"""
-	# Buscar el tema más relevante usando vectorización
-	# Usamos un umbral más bajo (0.7) para permitir más flexibilidad
-	topic = find_topic_by_text(task, min_similarity=0.7)
-	
-	if topic and topic.get("id"):
-		return topic["id"]
-	
-	# Si no encuentra un tema, usar el tema por defecto
-	return default_topic_id
+_EXERCISES_PER_TOPIC_CYPHER = """
+MATCH (e:Exercise)-[:BELONGS_TO]->(t:Topic)
+RETURN t.nombre AS tema, count(e) AS count
+ORDER BY count DESC
+"""
+
+# Textos por request de embeddings (/api/embed) y por UNWIND de vectores
+BATCH_SIZE = 32
+
+# Requests de embeddings en paralelo (Ollama los atiende hasta OLLAMA_NUM_PARALLEL)
+EMBED_WORKERS = 4
+
+# Tema para los ejercicios sin un tema relevante
+DEFAULT_TOPIC_ID = "topic_arquitectura"
+
+# Ejercicios (con su vector) por sentencia UNWIND de actualización
+UPDATE_BATCH_SIZE = 200
+
+_UPDATE_EXERCISES_CYPHER = """
+UNWIND $rows AS row
+MATCH (e:Exercise {id: row.id})
+SET e.vector = coalesce(row.vec, e.vector), e.task_hash = coalesce(row.hash, e.task_hash)
+WITH e, row
+WHERE row.move
+MATCH (t:Topic {id: row.topic_id})
+OPTIONAL MATCH (e)-[r:BELONGS_TO]->(:Topic)
+DELETE r
+WITH DISTINCT e, t
+MERGE (e)-[:BELONGS_TO]->(t)
+"""
 
 
 def revectorize_and_reassign_exercises() -> None:
 	"""
-	Vectoriza todos los ejercicios y los reasocia al tema más relevante.
+	Vectoriza los ejercicios nuevos o modificados y reasocia todos al tema más relevante.
 	"""
 	cfg = get_config()
 	embed_client = OllamaEmbeddingClient()
@@ -55,10 +72,12 @@ def revectorize_and_reassign_exercises() -> None:
 	exercises = run_query(
 		"""
 		MATCH (e:Exercise)-[r:BELONGS_TO]->(t:Topic)
-		RETURN e.id AS id, e.task AS task, t.id AS current_topic_id, t.nombre AS current_topic_nombre
+		RETURN e.id AS id, e.task AS task, e.task_hash AS task_hash, e.vector AS vector,
+			t.id AS current_topic_id, t.nombre AS current_topic_nombre
 		ORDER BY e.id
 		""",
-		{}
+		{},
+		write=False,
 	)
 	
 	if not exercises:
@@ -69,58 +88,58 @@ def revectorize_and_reassign_exercises() -> None:
 	
 	# Estadísticas
 	topic_stats: Dict[str, int] = {}
-	reassigned_count = 0
-	revectorized_count = 0
 	
-	# Procesar cada ejercicio
+	# Vectorizar solo los ejercicios cuyo enunciado (o modelo) cambió desde la última vez:
+	# task_hash guarda el hash de modelo + enunciado con el que se calculó el vector
+	hashes = [cache_key(embed_client.model, e["task"]) for e in exercises]
+	exercise_vectors: List[List[float]] = [e["vector"] for e in exercises]
+	stale = [i for i, (e, h) in enumerate(zip(exercises, hashes)) if e["vector"] is None or e["task_hash"] != h]
+	print(f"\n🔄 Vectorizando {len(stale)} ejercicios nuevos o modificados...")
+	batches = embed_client.embed_batches([exercises[i]["task"] for i in stale], BATCH_SIZE, EMBED_WORKERS)
+	total = (len(stale) + BATCH_SIZE - 1) // BATCH_SIZE
+	stale_iter = iter(stale)
+	for vectors in tqdm(batches, total=total, desc="Vectorizando ejercicios"):
+		for vec in vectors:
+			exercise_vectors[next(stale_iter)] = vec
+	stale_set = set(stale)
+	revectorized_count = len(stale)
+	
+	# Vectores de los temas, leídos una vez para todos los ejercicios
+	topic_ids, topic_matrix = load_topic_vectors()
+	
+	# Elegir el tema de cada ejercicio
 	print("\n🔄 Procesando ejercicios...")
-	for exercise in tqdm(exercises, desc="Reasociando ejercicios"):
+	rows: List[Dict[str, Any]] = []
+	moves = 0
+	# Tema más relevante de cada ejercicio con los vectores recién calculados (sin volver a embeber los enunciados)
+	best_topic_ids = find_best_topics_for_exercises(exercise_vectors, topic_ids, topic_matrix, DEFAULT_TOPIC_ID)
+	for i, (exercise, best_topic_id) in enumerate(zip(exercises, best_topic_ids)):
 		exercise_id = exercise["id"]
-		task = exercise["task"]
-		current_topic_id = exercise["current_topic_id"]
-		
-		# Encontrar el tema más relevante para este ejercicio
-		best_topic_id = find_best_topic_for_exercise(task, embed_client)
 		
 		# Actualizar estadísticas
 		topic_stats[best_topic_id] = topic_stats.get(best_topic_id, 0) + 1
 		
-		# Vectorizar el ejercicio (si no está vectorizado o actualizar)
-		exercise_text = task
-		exercise_vector = embed_client.embed(exercise_text)
-		revectorized_count += 1
-		
-		# Actualizar el vector del ejercicio
-		run_query(
-			"MATCH (e:Exercise {id: $id}) SET e.vector = $vec",
-			{"id": exercise_id, "vec": exercise_vector}
-		)
-		
-		# Si el tema cambió, reasociar el ejercicio
-		if best_topic_id != current_topic_id:
-			# Eliminar la relación antigua
-			run_query(
-				"""
-				MATCH (e:Exercise {id: $id})-[r:BELONGS_TO]->(t:Topic)
-				DELETE r
-				""",
-				{"id": exercise_id}
-			)
-			
-			# Crear la nueva relación
-			run_query(
-				"""
-				MATCH (e:Exercise {id: $id})
-				MATCH (t:Topic {id: $topic_id})
-				MERGE (e)-[:BELONGS_TO]->(t)
-				""",
-				{"id": exercise_id, "topic_id": best_topic_id}
-			)
-			
-			reassigned_count += 1
+		# Si el tema cambió, reasociar el ejercicio; vector y hash solo si se recalculó
+		move = best_topic_id != exercise["current_topic_id"]
+		if i in stale_set or move:
+			rows.append({
+				"id": exercise_id,
+				"vec": exercise_vectors[i] if i in stale_set else None,
+				"hash": hashes[i] if i in stale_set else None,
+				"topic_id": best_topic_id,
+				"move": move,
+			})
+		if move:
+			moves += 1
 			if sys.stdout.isatty():
 				tqdm.write(f"   🔄 Ejercicio {exercise_id}: {exercise.get('current_topic_nombre', 'Desconocido')} -> {best_topic_id}")
 	
+	# Una sola sentencia por lote: guarda el vector nuevo y, si el tema cambió,
+	# elimina la relación antigua y crea la nueva
+	for i in tqdm(range(0, len(rows), UPDATE_BATCH_SIZE), desc="Actualizando ejercicios"):
+		run_write(_UPDATE_EXERCISES_CYPHER, {"rows": rows[i:i + UPDATE_BATCH_SIZE]})
+	reassigned_count = moves
+	
 	# Mostrar estadísticas
 	print("\n📊 Estadísticas de reasociación:")
 	print(f"   - Ejercicios procesados: {len(exercises)}")
@@ -128,13 +147,18 @@ def revectorize_and_reassign_exercises() -> None:
 	print(f"   - Ejercicios vectorizados: {revectorized_count}")
 	
 	print("\n📊 Ejercicios por tema después de la reasociación:")
-	for topic_id, count in sorted(topic_stats.items(), key=lambda x: x[1], reverse=True):
-		topic_name = run_query(
-			"MATCH (t:Topic {id: $id}) RETURN t.nombre AS nombre",
-			{"id": topic_id}
+	# Nombres de todos los temas en una sola consulta
+	names = {
+		r["id"]: r["nombre"]
+		for r in run_query(
+			"MATCH (t:Topic) WHERE t.id IN $ids RETURN t.id AS id, t.nombre AS nombre",
+			{"ids": list(topic_stats)},
+			write=False,
 		)
-		if topic_name:
-			print(f"   - {topic_name[0]['nombre']}: {count} ejercicios")
+	}
+	for topic_id, count in sorted(topic_stats.items(), key=lambda x: x[1], reverse=True):
+		if topic_id in names:
+			print(f"   - {names[topic_id]}: {count} ejercicios")
 	
 	print("\n✅ Proceso completado exitosamente!")
 
@@ -148,7 +172,7 @@ def main() -> None:
 	
 	# Mostrar estadísticas antes
 	print("📊 Estadísticas ANTES de reasociar:")
-	exercises_before = run_query("MATCH (e:Exercise)-[:BELONGS_TO]->(t:Topic) RETURN t.nombre AS tema, count(e) AS count ORDER BY count DESC", {})
+	exercises_before = run_query(_EXERCISES_PER_TOPIC_CYPHER, {}, write=False)
 	if exercises_before:
 		print("   Ejercicios por tema:")
 		for r in exercises_before:
@@ -162,7 +186,7 @@ def main() -> None:
 	
 	# Mostrar estadísticas después
 	print("\n📊 Estadísticas DESPUÉS de reasociar:")
-	exercises_after = run_query("MATCH (e:Exercise)-[:BELONGS_TO]->(t:Topic) RETURN t.nombre AS tema, count(e) AS count ORDER BY count DESC", {})
+	exercises_after = run_query(_EXERCISES_PER_TOPIC_CYPHER, {}, write=False)
 	if exercises_after:
 		print("   Ejercicios por tema:")
 		for r in exercises_after:
@@ -13,7 +13,7 @@ _ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if _ROOT not in sys.path:
 	sys.path.insert(0, _ROOT)
 
-from app.db.neo4j_client import run_query
+from app.db.neo4j_client import unwind_in_transactions
 from app.embeddings.ollama_embeddings import OllamaEmbeddingClient
 from app.config import get_config
 
@@ -22,25 +22,32 @@ app = typer.Typer(add_completion=False)
 _embed = OllamaEmbeddingClient()
 
 
-def _update_node_vector(label: str, node_id: str, vector: List[float], id_type: str, id_field: str, vector_prop: str) -> None:
+# {id, vec} rows sent per request; the server commits them every --batch-size rows
+_UPLOAD_ROWS = 5000
+
+
+def _update_node_vectors(label: str, rows: List[dict], id_type: str, id_field: str, vector_prop: str, batch_size: int) -> None:
+	"""
+	Sets vector_prop on each {id, vec} row in one request, committed server-side every batch_size rows.
+	"""
 	if id_type == "property":
-		cypher = f"MATCH (n:{label} {{{id_field}: $id}}) SET n.{vector_prop} = $vec"
-		run_query(cypher, {"id": node_id, "vec": vector})
+		cypher = f"MATCH (n:{label} {{{id_field}: row.id}}) SET n.{vector_prop} = row.vec"
 	else:
 		# internal id
-		cypher = f"MATCH (n) WHERE id(n) = toInteger($id) AND '{label}' IN labels(n) SET n.{vector_prop} = $vec"
-		run_query(cypher, {"id": node_id, "vec": vector})
+		cypher = f"MATCH (n) WHERE id(n) = toInteger(row.id) AND '{label}' IN labels(n) SET n.{vector_prop} = row.vec"
+	unwind_in_transactions(cypher, rows, batch_size)
 
 
 @app.command()
 def main(
 	label: str = typer.Option(..., help="Target label: Document|Section|Exercise|Topic"),
-	csv: str = typer.Option(..., help="Path to CSV file"),
+	csv: str = typer.Option(..., help="Path to CSV file (.parquet files from export_vectors_csv --format parquet also work)"),
 	id_field: str = typer.Option("id", help="CSV column for node id (or internal id)"),
 	text_field: Optional[List[str]] = typer.Option(None, help="CSV column(s) to concatenate as text", rich_help_panel="Text"),
 	id_type: str = typer.Option("property", help="Identifier type: property|internal"),
 	vector_prop: str = typer.Option("vector", help="Node property to store the vector"),
-	batch_size: int = typer.Option(32, help="Client-side batch size for embedding calls"),
+	batch_size: int = typer.Option(32, help="Texts per embedding request and rows per vector update transaction"),
+	workers: int = typer.Option(4, help="Embedding requests in flight at once (Ollama serves up to OLLAMA_NUM_PARALLEL)"),
 	dry_run: bool = typer.Option(False, help="Only print generated Cypher"),
 ) -> None:
 	cfg = get_config()
@@ -51,7 +58,7 @@ def main(
 		print("At least one --text-field is required", file=sys.stderr)
 		raise typer.Exit(code=1)
 
-	df = pd.read_csv(csv)
+	df = pd.read_parquet(csv) if csv.lower().endswith(".parquet") else pd.read_csv(csv)
 	if id_field not in df.columns:
 		print(f"CSV is missing id_field '{id_field}'", file=sys.stderr)
 		raise typer.Exit(code=1)
@@ -60,29 +67,32 @@ def main(
 			print(f"CSV is missing text_field '{tf}'", file=sys.stderr)
 			raise typer.Exit(code=1)
 
-	def join_text(row) -> str:
-		return "\n\n".join(str(row[tf]) for tf in text_field if pd.notna(row[tf]))
-
-	texts = [join_text(row) for _, row in df.iterrows()]
-	ids = [str(row[id_field]) for _, row in df.iterrows()]
-
-	# Embed in small batches (Ollama embeds one by one under the hood)
-	vectors: List[List[float]] = []
-	for i in tqdm(range(0, len(texts), batch_size), desc="Embedding"):
-		chunk = texts[i : i + batch_size]
-		for t in chunk:
-			vectors.append(_embed.embed(t))
+	# Plain tuples per row instead of a Series per row (iterrows); empty cells are skipped
+	texts = [
+		"\n\n".join(str(v) for v in values if pd.notna(v))
+		for values in df[list(text_field)].itertuples(index=False, name=None)
+	]
+	ids = df[id_field].astype(str).tolist()
 
 	if dry_run:
-		for node_id, vec in zip(ids, vectors):
+		# Preview only: the dimension comes from the cached probe instead of embedding every row
+		dims = _embed.detect_dimension()
+		for node_id in ids:
 			if id_type == "property":
-				print(f"MATCH (n:{label} {{{id_field}: '{node_id}'}}) SET n.{vector_prop} = [..{len(vec)} dims..];")
+				print(f"MATCH (n:{label} {{{id_field}: '{node_id}'}}) SET n.{vector_prop} = [..{dims} dims..];")
 			else:
-				print(f"MATCH (n) WHERE id(n) = {node_id} AND '{label}' IN labels(n) SET n.{vector_prop} = [..{len(vec)} dims..];")
+				print(f"MATCH (n) WHERE id(n) = {node_id} AND '{label}' IN labels(n) SET n.{vector_prop} = [..{dims} dims..];")
 		return
 
-	for node_id, vec in tqdm(list(zip(ids, vectors)), desc="Updating", total=len(ids)):
-		_update_node_vector(label, node_id, vec, id_type, id_field, vector_prop)
+	# One /api/embed request per batch, up to `workers` of them concurrently
+	vectors: List[List[float]] = []
+	total = (len(texts) + batch_size - 1) // batch_size
+	for batch_vectors in tqdm(_embed.embed_batches(texts, batch_size, workers), total=total, desc="Embedding"):
+		vectors.extend(batch_vectors)
+
+	rows = [{"id": node_id, "vec": vec} for node_id, vec in zip(ids, vectors)]
+	for i in tqdm(range(0, len(rows), _UPLOAD_ROWS), desc="Updating"):
+		_update_node_vectors(label, rows[i : i + _UPLOAD_ROWS], id_type, id_field, vector_prop, batch_size)
 
 	print(f"Updated {len(ids)} {label} node(s) with vectors in property '{vector_prop}'.")
 